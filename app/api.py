@@ -2,16 +2,28 @@ from fastapi import FastAPI, HTTPException, UploadFile, File, Form
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
 import os
+import asyncio
+import logging
+import logging.handlers
 from dotenv import load_dotenv
 import tempfile
 from typing import Optional, Dict, Any
-from audio_transcriber import transcribe_audio
+from audio_transcriber import transcribe_audio_async
 from caption_analyzer import analyze_caption
-from main import get_google_drive_service, download_file_to_local, extract_file_id_from_link
+from main import get_google_drive_service, download_with_thread_service, extract_file_id_from_link, remove_downloaded_file
 
 # Load environment variables
 load_dotenv("/opt/app/credentials/.env")
 
+# Read once at startup; a missing key fails here instead of on every request
+OPENAI_API_KEY = os.environ["OPENAI_API_KEY"]
+
+# Uploads are copied to disk in chunks of this size
+UPLOAD_CHUNK_SIZE = 1 << 20  # 1MB
+
+# Log records buffered before they are written to the console
+LOG_BUFFER_CAPACITY = 100
+
 # Initialize FastAPI app
 app = FastAPI(
     title="Audio Processing API",
@@ -28,6 +40,21 @@ app.add_middleware(
     allow_headers=["*"],  # Allows all headers
 )
 
+@app.on_event("startup")
+async def configure_logging():
+    """Buffer log records and write them out in batches instead of one flush per line."""
+    log_handler = logging.handlers.MemoryHandler(
+        capacity=LOG_BUFFER_CAPACITY,
+        flushLevel=logging.ERROR,
+        target=logging.StreamHandler()
+    )
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(name)s %(message)s", handlers=[log_handler])
+
+@app.on_event("shutdown")
+async def flush_logs():
+    """Write out any buffered log records."""
+    logging.shutdown()
+
 # Pydantic models for request/response validation
 class TranscriptionResponse(BaseModel):
     success: bool
@@ -56,11 +83,10 @@ async def health_check():
     """
     try:
         # Check OpenAI API key
-        openai_api_key = os.getenv('OPENAI_API_KEY')
-        openai_configured = bool(openai_api_key)
+        openai_configured = bool(OPENAI_API_KEY)
         
         # Check Google Drive service
-        drive_service = get_google_drive_service()
+        drive_service = await asyncio.to_thread(get_google_drive_service)
         drive_configured = bool(drive_service)
         
         return {
@@ -81,7 +107,7 @@ async def debug_environment():
     Debug endpoint to check environment variables.
     """
     return {
-        "openai_key_set": bool(os.getenv('OPENAI_API_KEY')),
+        "openai_key_set": bool(OPENAI_API_KEY),
         "temp_dir": tempfile.gettempdir(),
         "working_dir": os.getcwd(),
         "python_path": os.getenv('PYTHONPATH')
@@ -93,19 +119,17 @@ async def transcribe_uploaded_file(file: UploadFile = File(...)):
     Transcribe an uploaded audio file.
     """
     try:
-        # Create a temporary file
-        with tempfile.NamedTemporaryFile(delete=False) as temp_file:
-            content = await file.read()
-            temp_file.write(content)
+        # Stream the upload to a temporary file in fixed-size chunks, keeping the
+        # original extension so ffmpeg can detect the format. A 1MB local write is
+        # quick, so it runs inline rather than waiting on a shared executor thread.
+        suffix = os.path.splitext(file.filename or "")[1]
+        with tempfile.NamedTemporaryFile(delete=False, suffix=suffix) as temp_file:
+            while chunk := await file.read(UPLOAD_CHUNK_SIZE):
+                temp_file.write(chunk)
             temp_path = temp_file.name
 
-        # Get OpenAI API key
-        openai_api_key = os.getenv('OPENAI_API_KEY')
-        if not openai_api_key:
-            raise HTTPException(status_code=500, detail="OpenAI API key not configured")
-
         # Transcribe the audio
-        result = transcribe_audio(openai_api_key, temp_path)
+        result = await transcribe_audio_async(OPENAI_API_KEY, temp_path)
 
         # Clean up temporary file
         os.unlink(temp_path)
@@ -123,31 +147,23 @@ async def transcribe_drive_file(request: DriveFileRequest):
     Transcribe an audio file from Google Drive.
     """
     try:
-        # Get OpenAI API key
-        openai_api_key = os.getenv('OPENAI_API_KEY')
-        if not openai_api_key:
-            raise HTTPException(status_code=500, detail="OpenAI API key not configured")
-
         # Extract file ID from link if necessary
         file_id = extract_file_id_from_link(request.file_id_or_link)
         if not file_id:
             raise HTTPException(status_code=400, detail="Invalid file ID or link")
 
-        # Get Google Drive service
-        service = get_google_drive_service()
-        if not service:
-            raise HTTPException(status_code=500, detail="Failed to initialize Google Drive service")
-
-        # Download the file
-        temp_path = download_file_to_local(service, file_id)
+        # Download the file on a worker thread with that thread's own Drive service,
+        # since the httplib2 connection behind a service is not thread-safe
+        temp_path = await asyncio.to_thread(download_with_thread_service, file_id)
         if not temp_path:
             raise HTTPException(status_code=404, detail="File not found in Google Drive")
 
-        # Transcribe the audio
-        result = transcribe_audio(openai_api_key, temp_path)
-
-        # Clean up temporary file
-        os.unlink(temp_path)
+        try:
+            # Transcribe the audio
+            result = await transcribe_audio_async(OPENAI_API_KEY, temp_path)
+        finally:
+            # Clean up temporary file and its download cache entry
+            remove_downloaded_file(temp_path)
 
         return result
 
@@ -162,13 +178,8 @@ async def analyze_text(text: str = Form(...)):
     Analyze text content.
     """
     try:
-        # Get OpenAI API key
-        openai_api_key = os.getenv('OPENAI_API_KEY')
-        if not openai_api_key:
-            raise HTTPException(status_code=500, detail="OpenAI API key not configured")
-
         # Analyze the text
-        result = analyze_caption(openai_api_key, text)
+        result = await asyncio.to_thread(analyze_caption, OPENAI_API_KEY, text)
         return result
 
     except Exception as e:
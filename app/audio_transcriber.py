@@ -1,27 +1,65 @@
 import os
-import openai
-from typing import Dict, Any, Optional
-from pydub import AudioSegment
+from typing import Dict, Any, List, Optional
 import tempfile
-from concurrent.futures import ThreadPoolExecutor, as_completed
-from tqdm import tqdm
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from batch_scheduler import get_batch_scheduler, close_batch_schedulers
+from lcs_merge import merge_overlapping_transcripts
+from tqdm.asyncio import tqdm
 from dotenv import load_dotenv
 import argparse
+import logging
 import shutil
+import math
+import subprocess
 
 load_dotenv()
-openai.api_key = os.getenv("OPENAI_API_KEY")
+OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
+
+logger = logging.getLogger(__name__)
 
 #max size before openai rejects request
 MAX_CHUNK_SIZE = 25 * 1024 * 1024  # 25MB
 
-def export_chunk(chunk, chunk_path):
-    """Export a chunk to MP3."""
-    chunk.export(chunk_path, format="mp3")
-    return chunk_path
+# Whisper calls are network bound, so many can be in flight on one event loop
+MAX_CONCURRENT_REQUESTS = 32
+
+# Short overlapping chunks transcribe in parallel; the overlap is merged back by aligning boundary words
+CHUNK_LENGTH_MS = 35_000
+CHUNK_OVERLAP_MS = 1_000
+# Chunks exported per ffmpeg process (each chunk holds an open output file)
+CHUNKS_PER_FFMPEG = 32
+# Whisper only needs 16 kHz mono speech; 24 kbps Opus is several times smaller than MP3.
+# Only the first audio stream is kept: cover art in MP3/M4A files would otherwise be
+# treated as video and encoded into every chunk.
+CHUNK_CODEC_ARGS = ["-map", "0:a:0", "-vn", "-ac", "1", "-ar", "16000", "-c:a", "libopus", "-b:a", "24k"]
+CHUNK_EXTENSION = ".ogg"
+
+def get_audio_duration(file_path):
+    """Return the duration of an audio file in seconds using ffprobe."""
+    result = subprocess.run(
+        ["ffprobe", "-v", "error", "-show_entries", "format=duration", "-of", "csv=p=0", file_path],
+        capture_output=True,
+        text=True,
+        check=True
+    )
+    return float(result.stdout.strip())
+
+def export_chunk_group(file_path, chunk_dir, first_index, starts, chunk_length_s):
+    """Export a group of chunks with one ffmpeg process that decodes only their span."""
+    group_start = starts[0]
+    # Seeking on the input resets timestamps, so each output offset is relative to group_start
+    cmd = ["ffmpeg", "-y", "-v", "error", "-ss", f"{group_start:.3f}", "-i", file_path]
+    chunk_paths = []
+    for offset, start in enumerate(starts):
+        chunk_path = os.path.join(chunk_dir, f"chunk_{first_index + offset:04d}{CHUNK_EXTENSION}")
+        cmd += ["-ss", f"{start - group_start:.3f}", "-t", f"{chunk_length_s:.3f}", *CHUNK_CODEC_ARGS, chunk_path]
+        chunk_paths.append(chunk_path)
+    subprocess.run(cmd, check=True)
+    return chunk_paths
 
-def split_audio(file_path, chunk_dir=None, chunk_length_ms=5 * 60 * 1000, max_threads=4):
-    """Split audio into ~5-minute chunks and export them in parallel."""
+def split_audio(file_path, chunk_dir=None, chunk_length_ms=CHUNK_LENGTH_MS, overlap_ms=CHUNK_OVERLAP_MS):
+    """Split audio into short overlapping Opus chunks that can be transcribed in parallel."""
     # Create a temporary directory if none provided
     if chunk_dir is None:
         chunk_dir = tempfile.mkdtemp(prefix="audio_chunks_")
@@ -29,117 +67,139 @@ def split_audio(file_path, chunk_dir=None, chunk_length_ms=5 * 60 * 1000, max_th
     os.makedirs(chunk_dir, exist_ok=True)
     
     try:
-        # Load the audio file
-        print(f"Loading audio file: {file_path}")
-        audio = AudioSegment.from_file(file_path)
-        print(f"Audio duration: {len(audio)/1000/60:.2f} minutes")
+        duration = get_audio_duration(file_path)
+        logger.info(f"Audio duration: {duration/60:.2f} minutes")
         
-        # Calculate number of chunks needed
-        total_chunks = (len(audio) + chunk_length_ms - 1) // chunk_length_ms
-        print(f"Splitting into {total_chunks} chunks of approximately {chunk_length_ms/1000/60:.1f} minutes each")
+        # Chunks start every chunk_length_ms and run overlap_ms into the next one. A chunk
+        # starting within overlap_ms of the end lies wholly inside the previous chunk's
+        # overlap and is too short for Whisper, so it is skipped.
+        step_s = chunk_length_ms / 1000
+        overlap_s = overlap_ms / 1000
+        starts = [
+            i * step_s for i in range(math.ceil(duration / step_s))
+            if i == 0 or i * step_s < duration - overlap_s
+        ]
+        logger.info(f"Splitting into {len(starts)} chunks of {step_s:.0f}s with {overlap_s:.1f}s overlap")
         
-        tasks = []
-        # Split up audio into chunks that can be transcribed concurrently
-        for i, start in enumerate(range(0, len(audio), chunk_length_ms)):
-            end = min(start + chunk_length_ms, len(audio))
-            chunk = audio[start:end]
-            chunk_path = os.path.join(chunk_dir, f"chunk_{i:04d}.mp3")
-            tasks.append((chunk, chunk_path))
-        
-        chunk_paths = []
-        
-        # Run the export chunk utilizing threads, also adding a progress bar
-        with ThreadPoolExecutor(max_workers=max_threads) as executor:
-            futures = [executor.submit(export_chunk, chunk, path) for chunk, path in tasks]
-            for future in tqdm(as_completed(futures), total=len(futures), desc="Exporting chunks"):
-                chunk_paths.append(future.result())
+        # Each ffmpeg process handles a contiguous group of chunks; groups run in parallel
+        groups = [
+            (i, starts[i:i + CHUNKS_PER_FFMPEG])
+            for i in range(0, len(starts), CHUNKS_PER_FFMPEG)
+        ]
+        chunk_length_s = step_s + overlap_s
+        with ThreadPoolExecutor(max_workers=os.cpu_count() or 1) as executor:
+            results = executor.map(
+                lambda group: export_chunk_group(file_path, chunk_dir, group[0], group[1], chunk_length_s),
+                groups
+            )
+            chunk_paths = [path for group_paths in results for path in group_paths]
         
         # Verify chunk sizes
         for chunk_path in chunk_paths:
             size = os.path.getsize(chunk_path)
             if size > MAX_CHUNK_SIZE:
-                print(f"Warning: {chunk_path} is {size/1024/1024:.2f}MB, which exceeds the 25MB limit.")
-                print(f"  This chunk may be rejected by the API. Consider reducing chunk_length_ms.")
+                logger.warning(f"{chunk_path} is {size/1024/1024:.2f}MB, which exceeds the 25MB limit.")
+                logger.warning(f"  This chunk may be rejected by the API. Consider reducing chunk_length_ms.")
         
         return chunk_paths, chunk_dir
     except Exception as e:
-        print(f"Error splitting audio: {e}")
+        logger.error(f"Error splitting audio: {e}")
         # Clean up the temporary directory if we created it
         if chunk_dir and chunk_dir.startswith(tempfile.gettempdir()):
             shutil.rmtree(chunk_dir, ignore_errors=True)
         raise
 
-def transcribe_chunk(chunk_path, chunk_index, total_chunks):
-    """Transcribe a single chunk."""
+def read_chunk(chunk_path):
+    """Read a chunk file into memory."""
     with open(chunk_path, "rb") as f:
+        return f.read()
+
+async def transcribe_chunk(scheduler, semaphore, chunk_path, chunk_index):
+    """Transcribe a single chunk, returning its index alongside the text."""
+    async with semaphore:
         try:
+            data = await asyncio.to_thread(read_chunk, chunk_path)
             # Don't print here, let the progress bar handle the display
-            response = openai.Audio.transcribe(
-                model="whisper-1",
-                file=f
-            )
-            return response.text
+            text = await scheduler.submit(os.path.basename(chunk_path), data)
+            return chunk_index, text
         except Exception as e:
-            print(f"Error transcribing {chunk_path}: {e}")
-            return ""
+            logger.error(f"Error transcribing {chunk_path}: {e}")
+            return chunk_index, None
 
-def transcribe_chunks(chunks, max_threads=4):
-    """Transcribe chunks in parallel."""
-    transcripts = []
+async def transcribe_chunks_async(chunks, openai_api_key, max_concurrency=MAX_CONCURRENT_REQUESTS):
+    """Transcribe chunks concurrently through the shared batch scheduler."""
     total_chunks = len(chunks)
+    # Results are stored by chunk index so the transcript keeps the audio order
+    transcripts: List[Optional[str]] = [None] * total_chunks
+    semaphore = asyncio.Semaphore(max_concurrency)
+    scheduler = get_batch_scheduler(openai_api_key)
     
-    # Create a progress bar for the overall process
-    with tqdm(total=total_chunks, desc="Transcribing chunks", unit="chunk") as pbar:
-        with ThreadPoolExecutor(max_workers=max_threads) as executor:
-            # Submit all tasks with their indices
-            futures = {
-                executor.submit(transcribe_chunk, chunk, i, total_chunks): i 
-                for i, chunk in enumerate(chunks)
-            }
-            
-            # Process results as they complete
-            for future in as_completed(futures):
-                chunk_index = futures[future]
-                try:
-                    # Update progress bar with chunk information before processing
-                    chunk_name = os.path.basename(chunks[chunk_index])
-                    pbar.set_postfix({"chunk": f"{chunk_index+1}/{total_chunks}: {chunk_name}"})
-                    
-                    transcript = future.result()
-                    transcripts.append(transcript)
-                    # Update progress bar
-                    pbar.update(1)
-                except Exception as e:
-                    print(f"Error processing chunk {chunk_index+1}: {e}")
-                    pbar.update(1)  # Still update progress even if there was an error
+    tasks = [transcribe_chunk(scheduler, semaphore, chunk, i) for i, chunk in enumerate(chunks)]
+    for task in tqdm.as_completed(tasks, total=total_chunks, desc="Transcribing chunks", unit="chunk"):
+        chunk_index, transcript = await task
+        transcripts[chunk_index] = transcript
     
-    return " ".join(transcripts)
+    failed = [i for i, transcript in enumerate(transcripts) if transcript is None]
+    if len(failed) == total_chunks:
+        raise RuntimeError(f"Transcription failed for all {total_chunks} chunk(s)")
+    if failed:
+        logger.warning(f"{len(failed)} of {total_chunks} chunks failed; their audio is marked as missing")
+    
+    # Adjacent chunks overlap, so stitch them at their aligned boundary words; a failed
+    # chunk leaves a marked gap with the time span that has no transcript
+    return merge_overlapping_transcripts(transcripts, gap_marker=missing_audio_marker)
+
+def format_timestamp(seconds):
+    """Format seconds as H:MM:SS or M:SS."""
+    minutes, secs = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours}:{minutes:02d}:{secs:02d}" if hours else f"{minutes}:{secs:02d}"
+
+def missing_audio_marker(chunk_index):
+    """Text inserted in place of a chunk that could not be transcribed."""
+    start = chunk_index * CHUNK_LENGTH_MS / 1000
+    end = start + (CHUNK_LENGTH_MS + CHUNK_OVERLAP_MS) / 1000
+    return f"[missing audio {format_timestamp(start)}-{format_timestamp(end)}]"
 
-def convert_audio(file_path):
+def run_blocking(coro):
+    """Run a coroutine to completion, closing the schedulers it created."""
+    async def runner():
+        try:
+            return await coro
+        finally:
+            await close_batch_schedulers()
+    return asyncio.run(runner())
+
+def transcribe_chunks(chunks, openai_api_key=None):
+    """Transcribe chunks concurrently (blocking wrapper)."""
+    return run_blocking(transcribe_chunks_async(chunks, openai_api_key or OPENAI_API_KEY))
+
+async def convert_audio_async(file_path, openai_api_key):
     """Convert audio to text, splitting if needed."""
     file_size = os.path.getsize(file_path)
-    print(f"File size: {file_size/1024/1024:.2f}MB")
+    logger.info(f"File size: {file_size/1024/1024:.2f}MB")
     
     if file_size < MAX_CHUNK_SIZE:
         #print("File is small enough to process directly")
-        return transcribe_chunks([file_path])
+        return await transcribe_chunks_async([file_path], openai_api_key)
     else:
         #print(f"File is too large ({file_size/1024/1024:.2f}MB), splitting into chunks")
-        chunks, chunk_dir = split_audio(file_path)
+        chunks, chunk_dir = await asyncio.to_thread(split_audio, file_path)
         try:
-            result = transcribe_chunks(chunks)
+            result = await transcribe_chunks_async(chunks, openai_api_key)
             return result
         finally:
             # Clean up the temporary directory if we created it
             if chunk_dir and chunk_dir.startswith(tempfile.gettempdir()):
                 shutil.rmtree(chunk_dir, ignore_errors=True)
 
-def transcribe_audio(openai_api_key: str, audio_file_path: str) -> Dict[str, Any]:
+def convert_audio(file_path, openai_api_key=None):
+    """Convert audio to text, splitting if needed (blocking wrapper)."""
+    return run_blocking(convert_audio_async(file_path, openai_api_key or OPENAI_API_KEY))
+
+async def transcribe_audio_async(openai_api_key: str, audio_file_path: str) -> Dict[str, Any]:
     """Transcribe an audio file using OpenAI's Whisper model."""
     try:
-        # Initialize OpenAI client
-        openai.OpenAI(api_key=openai_api_key)
-        
         # Check if the file exists
         if not os.path.exists(audio_file_path):
             return {
@@ -149,10 +209,10 @@ def transcribe_audio(openai_api_key: str, audio_file_path: str) -> Dict[str, Any
         
         # Get file size
         file_size = os.path.getsize(audio_file_path)
-        print(f"Processing audio file: {audio_file_path} ({file_size/1024/1024:.2f}MB)")
+        logger.info(f"Processing audio file: {audio_file_path} ({file_size/1024/1024:.2f}MB)")
         
         # Transcribe the audio
-        transcription = convert_audio(audio_file_path)
+        transcription = await convert_audio_async(audio_file_path, openai_api_key)
         
         if not transcription:
             return {
@@ -170,6 +230,10 @@ def transcribe_audio(openai_api_key: str, audio_file_path: str) -> Dict[str, Any
             "error": f"Error transcribing audio: {str(e)}"
         }
 
+def transcribe_audio(openai_api_key: str, audio_file_path: str) -> Dict[str, Any]:
+    """Transcribe an audio file using OpenAI's Whisper model (blocking wrapper)."""
+    return run_blocking(transcribe_audio_async(openai_api_key, audio_file_path))
+
 def transcribe_audio_from_drive(openai_api_key: str, service, file_id: str) -> Dict[str, Any]:
     """
     Download an audio file from Google Drive and transcribe it.
@@ -210,6 +274,8 @@ def transcribe_audio_from_drive(openai_api_key: str, service, file_id: str) -> D
         }
 
 if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    
     # Set up argument parser
     parser = argparse.ArgumentParser(description='Transcribe audio files using OpenAI Whisper')
     parser.add_argument('input_path', help='Path to the audio file to transcribe')
@@ -220,6 +286,11 @@ if __name__ == "__main__":
     input_path = args.input_path
     output_path = args.output if args.output else "transcript.txt"
     
+    # Check the OpenAI API key before doing any work
+    if not OPENAI_API_KEY:
+        print("Error: OPENAI_API_KEY environment variable not set")
+        exit(1)
+    
     # Check if input file exists
     if not os.path.exists(input_path):
         print(f"Error: File not found: {input_path}")
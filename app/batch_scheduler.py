@@ -0,0 +1,110 @@
+import asyncio
+import weakref
+import httpx
+from typing import Dict, List, Tuple
+
+WHISPER_API_URL = "https://api.openai.com/v1/audio/transcriptions"
+WHISPER_TIMEOUT = 600.0  # seconds
+
+# Micro-batching window: dispatch once this many requests are queued or the wait expires
+MAX_BATCH_SIZE = 16
+MAX_BATCH_WAIT_MS = 20
+MAX_CONNECTIONS = 64
+
+class BatchScheduler:
+    """
+    Collect Whisper requests from concurrent callers and dispatch them in micro-batches.
+
+    All requests share one HTTP/2 client, so callers reuse the same TLS session
+    instead of opening a new connection per chunk.
+    """
+
+    def __init__(self, openai_api_key: str, batch_size: int = MAX_BATCH_SIZE, max_wait_ms: int = MAX_BATCH_WAIT_MS):
+        self.client = httpx.AsyncClient(
+            http2=True,
+            headers={"Authorization": f"Bearer {openai_api_key}"},
+            timeout=httpx.Timeout(WHISPER_TIMEOUT, connect=10.0),
+            limits=httpx.Limits(max_connections=MAX_CONNECTIONS, max_keepalive_connections=MAX_CONNECTIONS)
+        )
+        self.batch_size = batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.pending: List[Tuple[str, bytes, asyncio.Future]] = []
+        self.has_items = asyncio.Event()
+        self.batch_full = asyncio.Event()
+        self.worker = None
+        self.in_flight = set()
+
+    async def submit(self, file_name: str, data: bytes) -> str:
+        """Queue an audio payload for transcription and wait for its text."""
+        future = asyncio.get_running_loop().create_future()
+        self.pending.append((file_name, data, future))
+        self.has_items.set()
+        if len(self.pending) >= self.batch_size:
+            self.batch_full.set()
+        if self.worker is None or self.worker.done():
+            self.worker = asyncio.create_task(self._run())
+        return await future
+
+    async def _run(self):
+        """Drain the queue in batches of up to batch_size requests."""
+        while True:
+            await self.has_items.wait()
+            # Give other callers a short window to join the batch
+            try:
+                await asyncio.wait_for(self.batch_full.wait(), timeout=self.max_wait)
+            except asyncio.TimeoutError:
+                pass
+
+            batch = self.pending[:self.batch_size]
+            del self.pending[:self.batch_size]
+            if len(self.pending) < self.batch_size:
+                self.batch_full.clear()
+            if not self.pending:
+                self.has_items.clear()
+
+            # Fire the whole batch at once; responses are multiplexed over the shared connections
+            for file_name, data, future in batch:
+                task = asyncio.create_task(self._send(file_name, data, future))
+                self.in_flight.add(task)
+                task.add_done_callback(self.in_flight.discard)
+
+    async def _send(self, file_name: str, data: bytes, future: asyncio.Future):
+        """POST a single payload to Whisper and resolve its future."""
+        try:
+            response = await self.client.post(
+                WHISPER_API_URL,
+                data={"model": "whisper-1"},
+                files={"file": (file_name, data)}
+            )
+            response.raise_for_status()
+            if not future.done():
+                future.set_result(response.json()["text"])
+        except Exception as e:
+            if not future.done():
+                future.set_exception(e)
+
+    async def aclose(self):
+        """Stop the worker and close the shared client."""
+        if self.worker is not None:
+            self.worker.cancel()
+        for task in list(self.in_flight):
+            task.cancel()
+        await self.client.aclose()
+
+# Schedulers are bound to the event loop that created them
+_schedulers: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[str, BatchScheduler]]" = weakref.WeakKeyDictionary()
+
+def get_batch_scheduler(openai_api_key: str) -> BatchScheduler:
+    """Return the shared scheduler for the running event loop and API key."""
+    loop_schedulers = _schedulers.setdefault(asyncio.get_running_loop(), {})
+    scheduler = loop_schedulers.get(openai_api_key)
+    if scheduler is None:
+        scheduler = BatchScheduler(openai_api_key)
+        loop_schedulers[openai_api_key] = scheduler
+    return scheduler
+
+async def close_batch_schedulers():
+    """Close every scheduler bound to the running event loop."""
+    loop_schedulers = _schedulers.pop(asyncio.get_running_loop(), {})
+    for scheduler in loop_schedulers.values():
+        await scheduler.aclose()
@@ -1,6 +1,21 @@
 import openai
+import httpx
+import functools
 from typing import Dict, Any
 
+MAX_CONNECTIONS = 64
+
+@functools.lru_cache(maxsize=None)
+def get_openai_client(openai_api_key: str) -> openai.OpenAI:
+    """Return a shared OpenAI client for the API key so its connection pool is reused."""
+    return openai.OpenAI(
+        api_key=openai_api_key,
+        http_client=httpx.Client(
+            http2=True,
+            limits=httpx.Limits(max_connections=MAX_CONNECTIONS, max_keepalive_connections=MAX_CONNECTIONS)
+        )
+    )
+
 def analyze_caption(openai_api_key: str, content: str) -> Dict[str, Any]:
     """
     Analyze the caption content using OpenAI API.
@@ -13,8 +28,8 @@ def analyze_caption(openai_api_key: str, content: str) -> Dict[str, Any]:
         Dictionary containing the analysis results
     """
     try:
-        # Initialize OpenAI client
-        client = openai.OpenAI(api_key=openai_api_key)
+        # Reuse the shared OpenAI client
+        client = get_openai_client(openai_api_key)
         
         # Create the analysis prompt
         prompt = f"""You are given with a zooming meeting record transcript in which, Saikat Chakrabarti, who is a politician running for Congress to represent San Francisco, was talking to voters. Please clean the transcript into the format of Questions and Answers, where questions are from voters, and answers are from Saikat Chakrabarti. Please note that it is possible there is no identification in the transcript on who is speaker of each sentence. Please try your best to figure out which sentences are from Saikat, which are from voters. For example:
@@ -1,38 +1,56 @@
 from google.oauth2 import service_account
 from googleapiclient.discovery import build
-from googleapiclient.http import MediaFileUpload
+from googleapiclient.http import MediaFileUpload, MediaInMemoryUpload, MediaIoBaseDownload
 import os
 import io
 import re
 from dotenv import load_dotenv
-import tempfile
 import json
 import argparse
+import logging
+import asyncio
 from main import (
-    get_google_drive_service, 
+    get_thread_drive_service,
     download_file_to_local, 
+    remove_downloaded_file,
     is_audio_file, 
     process_file,
     AUDIO_EXTENSIONS,
     TEXT_EXTENSIONS
 )
+from audio_transcriber import transcribe_audio_async, run_blocking
+from caption_analyzer import analyze_caption
 
 # Load environment variables from .env file
 load_dotenv()
+OPENAI_API_KEY = os.getenv('OPENAI_API_KEY')
+
+logger = logging.getLogger(__name__)
 
 # Define your constants
 SCOPES = ['https://www.googleapis.com/auth/drive']  # Need write access to upload files
 SERVICE_ACCOUNT_FILE = 'service-account.json'
 OUTPUT_FILE_AFFIX = '_TRANSCRIPT'
 OUTPUT_FILE_EXTENSION = '.json'
+FOLDER_MIME_TYPE = 'application/vnd.google-apps.folder'
+MAX_CONCURRENT_DRIVE_REQUESTS = 8
+MAX_CONCURRENT_TRANSCRIPTIONS = 16
+AUDIO_EXT_TUPLE = tuple(ext.lower() for ext in AUDIO_EXTENSIONS)
+
+# Google Drive folder link patterns
+_USER_FOLDER_LINK_RE = re.compile(r'https://drive\.google\.com/drive/u/\d+/folders/([a-zA-Z0-9_-]+)')
+_FOLDER_LINK_RE = re.compile(r'https://drive\.google\.com/drive/folders/([a-zA-Z0-9_-]+)')
+_DRIVE_ID_RE = re.compile(r'^[a-zA-Z0-9_-]+$')
 
-def list_files_in_folder(service, folder_id, file_types=None):
-    """List all files in a Google Drive folder."""
+def list_files_in_folder(service, folder_id, file_types=None, include_folders=False):
+    """List all files in a Google Drive folder, optionally keeping subfolders alongside filtered files."""
     query = f"'{folder_id}' in parents and trashed = false"
     
     if file_types:
         # Create a query to filter by file extensions
         extension_query = " or ".join([f"name contains '{ext}'" for ext in file_types])
+        if include_folders:
+            extension_query = f"mimeType = '{FOLDER_MIME_TYPE}' or {extension_query}"
         query += f" and ({extension_query})"
     
     results = []
@@ -56,13 +74,18 @@ def list_files_in_folder(service, folder_id, file_types=None):
                 break
                 
         except Exception as e:
-            print(f"Error listing files: {str(e)}")
+            logger.error(f"Error listing files: {str(e)}")
             break
     
     return results
 
 def get_file_parent_folder(service, file_id):
-    """Get the parent folder ID of a file."""
+    """
+    Get the parent folder ID of a file.
+    
+    Deprecated: list_files_in_folder already returns 'parents' for each file;
+    read it from the listing instead of issuing an extra request per file.
+    """
     try:
         file_metadata = service.files().get(
             fileId=file_id,
@@ -75,65 +98,86 @@ def get_file_parent_folder(service, file_id):
             return parents[0]
         return None
     except Exception as e:
-        print(f"Error getting parent folder: {str(e)}")
+        logger.error(f"Error getting parent folder: {str(e)}")
         return None
 
-def get_processed_files_map(service, folder_id):
-    """Get a map of all processed files in a folder by checking JSON files once."""
+def with_thread_service(func, *args):
+    """Call func with the calling thread's Drive service as its first argument."""
+    return func(get_thread_drive_service(), *args)
+
+def read_processed_json(service, file):
+    """Fetch a transcript JSON into memory and return the original file name it records."""
+    # Transcript JSONs are small, so skip the temp file and download straight into a buffer
+    request = service.files().get_media(fileId=file['id'], supportsAllDrives=True)
+    buffer = io.BytesIO()
+    downloader = MediaIoBaseDownload(buffer, request, chunksize=1 << 20)
+    done = False
+    while not done:
+        status, done = downloader.next_chunk()
+    
+    data = json.loads(buffer.getvalue())
+    return data.get('original_file')
+
+def list_json_files(service, folder_id):
+    """List the JSON files directly inside a folder."""
+    query = f"'{folder_id}' in parents and mimeType = 'application/json' and trashed = false"
+    response = service.files().list(
+        q=query,
+        spaces='drive',
+        fields='files(id, name)',
+        supportsAllDrives=True
+    ).execute()
+    return response.get('files', [])
+
+async def get_processed_files_map_async(folder_id, drive_semaphore):
+    """Get a map of all processed files in a folder by fetching its JSON files concurrently."""
     processed_files = {}
     try:
         # List all files in the folder
-        query = f"'{folder_id}' in parents and mimeType = 'application/json' and trashed = false"
-        response = service.files().list(
-            q=query,
-            spaces='drive',
-            fields='files(id, name)',
-            supportsAllDrives=True
-        ).execute()
+        async with drive_semaphore:
+            files = await asyncio.to_thread(with_thread_service, list_json_files, folder_id)
+        
+        # Fetch every JSON file at once, bounded by the semaphore
+        async def fetch_json(file):
+            async with drive_semaphore:
+                return await asyncio.to_thread(with_thread_service, read_processed_json, file)
         
-        files = response.get('files', [])
+        results = await asyncio.gather(*[fetch_json(file) for file in files], return_exceptions=True)
         
-        # Check each JSON file
-        for file in files:
-            temp_file_path = download_file_to_local(service, file['id'])
-            if temp_file_path:
-                try:
-                    with open(temp_file_path, 'r', encoding='utf-8') as f:
-                        data = json.load(f)
-                        if 'original_file' in data:
-                            processed_files[data['original_file']] = file['name']
-                except Exception as e:
-                    print(f"Error reading JSON file {file['name']}: {str(e)}")
-                finally:
-                    # Clean up the temporary file
-                    if os.path.exists(temp_file_path):
-                        os.unlink(temp_file_path)
+        for file, original_file in zip(files, results):
+            if isinstance(original_file, Exception):
+                logger.error(f"Error reading JSON file {file['name']}: {str(original_file)}")
+            elif original_file:
+                processed_files[original_file] = file['name']
         
         return processed_files
     except Exception as e:
-        print(f"Error getting processed files map: {str(e)}")
+        logger.error(f"Error getting processed files map: {str(e)}")
         return {}
 
 def check_if_processed_file_exists(processed_files_map, file_name):
     """Check if a file has already been processed using the cached map."""
     if file_name in processed_files_map:
-        print(f"Found existing transcription for {file_name} in {processed_files_map[file_name]}")
+        logger.info(f"Found existing transcription for {file_name} in {processed_files_map[file_name]}")
         return True
     return False
 
 def upload_file_to_drive(service, file_path, parent_folder_id, filename):
     """Upload a file to Google Drive."""
+    media = MediaFileUpload(
+        file_path,
+        resumable=True
+    )
+    return upload_media_to_drive(service, media, parent_folder_id, filename)
+
+def upload_media_to_drive(service, media, parent_folder_id, filename):
+    """Upload a prepared media body to Google Drive."""
     try:
         file_metadata = {
             'name': filename,
             'parents': [parent_folder_id]
         }
         
-        media = MediaFileUpload(
-            file_path,
-            resumable=True
-        )
-        
         file = service.files().create(
             body=file_metadata,
             media_body=media,
@@ -141,50 +185,75 @@ def upload_file_to_drive(service, file_path, parent_folder_id, filename):
             supportsAllDrives=True
         ).execute()
         
-        print(f"File uploaded: {filename} (ID: {file.get('id')})")
+        logger.info(f"File uploaded: {filename} (ID: {file.get('id')})")
         return file.get('id')
     except Exception as e:
-        print(f"Error uploading file: {str(e)}")
-        # Print more detailed error information
-        import traceback
-        traceback.print_exc()
+        # Log the traceback for more detailed error information
+        logger.exception(f"Error uploading file: {str(e)}")
         return None
 
-def process_audio_file(service, file_id, file_name):
-    """Process an audio file and save the output."""
+def upload_output_data(service, output_data, parent_folder_id, output_filename):
+    """Upload the output data to Drive as a JSON file."""
+    # Transcript JSONs are small, so a single multipart upload from memory beats a resumable session
+    body = json.dumps(output_data, indent=2).encode('utf-8')
+    media = MediaInMemoryUpload(body, mimetype='application/json', resumable=False)
+    
+    # Upload the output file to the same folder as the original
+    return upload_media_to_drive(service, media, parent_folder_id, output_filename)
+
+def get_folder_name(service, folder_id):
+    """Get the display name of a folder."""
     try:
-        # Download the file
-        temp_file_path = download_file_to_local(service, file_id)
-        if not temp_file_path:
-            print(f"Failed to download file: {file_name}")
-            return None
-        
-        # Get OpenAI API key
-        openai_api_key = os.getenv('OPENAI_API_KEY')
-        if not openai_api_key:
-            print("Error: OPENAI_API_KEY environment variable not set")
-            return None
-        
-        # Transcribe the audio file
-        print(f"Transcribing audio file: {file_name}")
-        from audio_transcriber import transcribe_audio
-        result = transcribe_audio(openai_api_key, temp_file_path)
+        folder_metadata = service.files().get(
+            fileId=folder_id,
+            fields="name",
+            supportsAllDrives=True
+        ).execute()
+        return folder_metadata.get('name', f"Folder {folder_id}")
+    except Exception as e:
+        logger.error(f"Error getting folder name: {str(e)}")
+        return f"Folder {folder_id}"
+
+async def process_audio_file_async(file_id, file_name, parent_folder_id, openai_api_key, drive_semaphore, whisper_semaphore):
+    """Download, transcribe, analyze and upload a single audio file."""
+    try:
+        # Hold a transcription slot from before the download until the file is deleted,
+        # so at most MAX_CONCURRENT_TRANSCRIPTIONS audio files are on disk at once
+        async with whisper_semaphore:
+            # Download the file
+            async with drive_semaphore:
+                # The listing already gave us the name, so skip the metadata lookup
+                _, file_extension = os.path.splitext(file_name)
+                temp_file_path = await asyncio.to_thread(
+                    with_thread_service, download_file_to_local, file_id, None, file_extension
+                )
+            if not temp_file_path:
+                logger.error(f"Failed to download file: {file_name}")
+                return
+            
+            # Transcribe the audio file
+            logger.info(f"Transcribing audio file: {file_name}")
+            try:
+                result = await transcribe_audio_async(openai_api_key, temp_file_path)
+            finally:
+                # Clean up temporary file
+                if remove_downloaded_file(temp_file_path):
+                    logger.info(f"Cleaned up temporary file: {temp_file_path}")
         
         if not result["success"]:
-            print(f"Error transcribing audio: {result.get('error', 'Unknown error occurred')}")
-            return None
+            logger.error(f"Error transcribing audio: {result.get('error', 'Unknown error occurred')}")
+            return
         
         transcription = result["transcription"]
-        print("Transcription completed successfully.")
+        logger.info(f"Transcription completed successfully: {file_name}")
         
         # Analyze the transcription
-        print(f"Analyzing content from: {file_name}")
-        from caption_analyzer import analyze_caption
-        analysis_result = analyze_caption(openai_api_key, transcription)
+        logger.info(f"Analyzing content from: {file_name}")
+        analysis_result = await asyncio.to_thread(analyze_caption, openai_api_key, transcription)
         
         if not analysis_result["success"]:
-            print(f"Error analyzing content: {analysis_result.get('error', 'Unknown error occurred')}")
-            return None
+            logger.error(f"Error analyzing content: {analysis_result.get('error', 'Unknown error occurred')}")
+            return
         
         # Create output data
         output_data = {
@@ -193,133 +262,100 @@ def process_audio_file(service, file_id, file_name):
             "analysis": analysis_result["analysis"]
         }
         
-        # Clean up temporary file
-        if os.path.exists(temp_file_path):
-            os.unlink(temp_file_path)
-            print(f"Cleaned up temporary file: {temp_file_path}")
+        # Create output filename
+        base_name = os.path.splitext(file_name)[0]
+        output_filename = f"{base_name}{OUTPUT_FILE_AFFIX}{OUTPUT_FILE_EXTENSION}"
         
-        return output_data
+        async with drive_semaphore:
+            await asyncio.to_thread(with_thread_service, upload_output_data, output_data, parent_folder_id, output_filename)
+        logger.info(f"Completed processing: {file_name}")
     except Exception as e:
-        print(f"Error processing file: {str(e)}")
-        return None
+        logger.error(f"Error processing file {file_name}: {str(e)}")
 
-def process_folder(folder_id, indent_level=0):
-    """Process all audio files in a Google Drive folder and its subfolders."""
-    # Get Google Drive service with write access
-    service = get_google_drive_service()
-    
-    # Get folder name
-    try:
-        folder_metadata = service.files().get(
-            fileId=folder_id,
-            fields="name",
-            supportsAllDrives=True
-        ).execute()
-        folder_name = folder_metadata.get('name', f"Folder {folder_id}")
-    except Exception as e:
-        print(f"Error getting folder name: {str(e)}")
-        folder_name = f"Folder {folder_id}"
-    
-    # Create indentation for better readability
-    indent = "  " * indent_level
-    
-    # List all files in the current folder
-    all_files = list_files_in_folder(service, folder_id, [])
+async def process_folder(folder_id, openai_api_key, drive_semaphore, whisper_semaphore):
+    """Process all audio files in a Google Drive folder and its subfolders concurrently."""
+    async with drive_semaphore:
+        folder_name = await asyncio.to_thread(with_thread_service, get_folder_name, folder_id)
+        # List subfolders and audio files of the current folder in a single listing
+        all_files = await asyncio.to_thread(
+            with_thread_service, list_files_in_folder, folder_id, AUDIO_EXTENSIONS, True
+        )
     
-    # Print folder name
-    print(f"{indent}[FOLDER] {folder_name} (ID: {folder_id})")
+    # Output from concurrent folders interleaves, so every line names its folder
+    logger.info(f"[FOLDER] {folder_name} (ID: {folder_id})")
     
     # Get the map of processed files for this folder
-    processed_files_map = get_processed_files_map(service, folder_id)
+    processed_files_map = await get_processed_files_map_async(folder_id, drive_semaphore)
     
     # Separate files and folders
-    subfolders = [f for f in all_files if f.get('mimeType') == 'application/vnd.google-apps.folder']
-    regular_files = [f for f in all_files if f.get('mimeType') != 'application/vnd.google-apps.folder']
+    subfolders = [f for f in all_files if f.get('mimeType') == FOLDER_MIME_TYPE]
+    regular_files = [f for f in all_files if f.get('mimeType') != FOLDER_MIME_TYPE]
     
     # Print only audio files
-    audio_files_in_folder = [f for f in regular_files if any(f['name'].lower().endswith(ext) for ext in AUDIO_EXTENSIONS)]
-    if audio_files_in_folder:
-        for file in audio_files_in_folder:
-            file_name = file['name']
-            file_id = file['id']
-            print(f"{indent}  [AUDIO] {file_name} (ID: {file_id})")
+    audio_files = [f for f in regular_files if f['name'].lower().endswith(AUDIO_EXT_TUPLE)]
+    for file in audio_files:
+        logger.info(f"[{folder_name}] [AUDIO] {file['name']} (ID: {file['id']})")
     
-    # Process subfolders recursively without printing their names again
-    if subfolders:
-        for subfolder in subfolders:
-            subfolder_id = subfolder['id']
-            # Recursively process the subfolder without printing its name again
-            process_folder(subfolder_id, indent_level + 1)
+    # Subfolders are processed alongside the audio files of this folder
+    tasks = [
+        process_folder(subfolder['id'], openai_api_key, drive_semaphore, whisper_semaphore)
+        for subfolder in subfolders
+    ]
     
     # Process audio files in the current folder
-    audio_files = list_files_in_folder(service, folder_id, AUDIO_EXTENSIONS)
-    
     if audio_files:
-        print(f"{indent}  Processing {len(audio_files)} audio files in folder: {folder_name}")
+        logger.info(f"[{folder_name}] Processing {len(audio_files)} audio files")
         
-        # Process each audio file
         for file in audio_files:
             file_id = file['id']
             file_name = file['name']
             
-            # Get the parent folder ID
-            parent_folder_id = get_file_parent_folder(service, file_id)
+            # The listing already includes the parents, so no extra lookup is needed
+            parent_folder_id = file.get('parents', [None])[0]
             if not parent_folder_id:
-                print(f"{indent}  Could not determine parent folder for file: {file_name}")
+                logger.warning(f"[{folder_name}] Could not determine parent folder for file: {file_name}")
                 continue
             
             # Check if this file has already been processed using the cached map
             if check_if_processed_file_exists(processed_files_map, file_name):
                 continue
             
-            print(f"{indent}  Processing file: {file_name}")
-            
-            # Process the audio file
-            output_data = process_audio_file(service, file_id, file_name)
-            if not output_data:
-                print(f"{indent}  Failed to process file: {file_name}")
-                continue
-            
-            # Create output filename
-            base_name = os.path.splitext(file_name)[0]
-            output_filename = f"{base_name}{OUTPUT_FILE_AFFIX}{OUTPUT_FILE_EXTENSION}"
-            
-            # Save output to a temporary file
-            with tempfile.NamedTemporaryFile(mode='w', delete=False, suffix=OUTPUT_FILE_EXTENSION) as temp_file:
-                json.dump(output_data, temp_file, indent=2)
-                temp_file_path = temp_file.name
-            
-            # Upload the output file to the same folder as the original
-            upload_file_to_drive(service, temp_file_path, parent_folder_id, output_filename)
-            
-            # Clean up temporary file
-            os.unlink(temp_file_path)
-            print(f"{indent}  Completed processing: {file_name}")
+            logger.info(f"[{folder_name}] Processing file: {file_name}")
+            tasks.append(process_audio_file_async(
+                file_id, file_name, parent_folder_id, openai_api_key, drive_semaphore, whisper_semaphore
+            ))
     else:
-        print(f"{indent}  No audio files found in folder: {folder_name}")
+        logger.info(f"[{folder_name}] No audio files found")
+    
+    await asyncio.gather(*tasks)
+
+async def process_folder_tree(folder_id, openai_api_key):
+    """Process a folder tree with shared limits on Drive and Whisper concurrency."""
+    drive_semaphore = asyncio.Semaphore(MAX_CONCURRENT_DRIVE_REQUESTS)
+    whisper_semaphore = asyncio.Semaphore(MAX_CONCURRENT_TRANSCRIPTIONS)
+    await process_folder(folder_id, openai_api_key, drive_semaphore, whisper_semaphore)
 
 def extract_folder_id_from_link(link: str) -> str:
     """Extract folder ID from a Google Drive link."""
-    # Pattern for Google Drive folder links with user ID
-    pattern = r'https://drive\.google\.com/drive/u/\d+/folders/([a-zA-Z0-9_-]+)'
-    match = re.search(pattern, link)
+    # Google Drive folder links with user ID
+    match = _USER_FOLDER_LINK_RE.search(link)
     if match:
         return match.group(1)
     
-    # Pattern for standard Google Drive folder links
-    pattern = r'https://drive\.google\.com/drive/folders/([a-zA-Z0-9_-]+)'
-    match = re.search(pattern, link)
+    # Standard Google Drive folder links
+    match = _FOLDER_LINK_RE.search(link)
     if match:
         return match.group(1)
     
     # If the input is already a folder ID (no URL pattern found)
-    if re.match(r'^[a-zA-Z0-9_-]+$', link):
+    if _DRIVE_ID_RE.match(link):
         return link
     
-    print(f"Error: Could not extract folder ID from link: {link}")
+    logger.error(f"Error: Could not extract folder ID from link: {link}")
     return None
 
 def main():
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
     parser = argparse.ArgumentParser(description='Process audio files in a Google Drive folder')
     parser.add_argument('--folder', '-f', required=True, help='ID or link of the Google Drive folder to process')
     args = parser.parse_args()
@@ -330,8 +366,13 @@ def main():
         print("Error: Invalid Google Drive folder link or ID")
         return
     
+    # Check the OpenAI API key once before processing
+    if not OPENAI_API_KEY:
+        print("Error: OPENAI_API_KEY environment variable not set")
+        return
+    
     # Process the folder
-    process_folder(folder_id)
+    run_blocking(process_folder_tree(folder_id, OPENAI_API_KEY))
 
 if __name__ == "__main__":
     main() 
\ No newline at end of file
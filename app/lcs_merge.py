@@ -0,0 +1,104 @@
+import re
+from typing import Callable, Dict, List, Optional, Tuple
+
+# Words at each chunk boundary searched for the overlap. Chunks overlap by about 1s,
+# which is 2-5 spoken words; a wider window lets common words ("the", "and") line up
+# with text far from the real overlap.
+OVERLAP_WINDOW_WORDS = 5
+# Fewer contiguous aligned words than this is treated as a coincidence rather than an overlap
+MIN_OVERLAP_MATCHES = 2
+# Words Whisper may garble or cut at a chunk edge, allowed between the overlap and the boundary
+MAX_BOUNDARY_SLACK = 1
+
+_NORMALIZE_RE = re.compile(r"[^\w']+")
+
+def longest_common_run(a: List[int], b: List[int], slack: int) -> Tuple[int, int, int]:
+    """
+    Find the longest contiguous run shared by the end of a and the start of b.
+
+    Only runs followed by at most slack words of a and preceded by at most slack
+    words of b count; ties go to the run closest to the boundary.
+    Returns (a_end, b_end, length) with exclusive end indices.
+    """
+    n = len(a)
+    m = len(b)
+    # Both sides hold at most a window of words, so the table stays tiny
+    table = [[0] * (m + 1) for _ in range(n + 1)]
+    best_len = 0
+    best_i = 0
+    best_j = 0
+    best_gap = n + m
+    for i in range(1, n + 1):
+        for j in range(1, m + 1):
+            if a[i - 1] == b[j - 1]:
+                length = table[i - 1][j - 1] + 1
+                table[i][j] = length
+                # Words of a after the run and words of b before it
+                a_after = n - i
+                b_before = j - length
+                if a_after > slack or b_before > slack:
+                    continue
+                gap = a_after + b_before
+                if length > best_len or (length == best_len and gap < best_gap):
+                    best_len = length
+                    best_i = i
+                    best_j = j
+                    best_gap = gap
+    return best_i, best_j, best_len
+
+def tokenize(words: List[str], vocab: Dict[str, int]) -> List[int]:
+    """Map words to integer ids, ignoring case and punctuation."""
+    ids = []
+    for word in words:
+        key = _NORMALIZE_RE.sub("", word.lower())
+        ids.append(vocab.setdefault(key, len(vocab)))
+    return ids
+
+def merge_into(merged: List[str], words: List[str], vocab: Dict[str, int], window: int = OVERLAP_WINDOW_WORDS):
+    """Append words to merged, dropping the region where their boundaries overlap."""
+    tail_start = max(len(merged) - window, 0)
+    tail = tokenize(merged[tail_start:], vocab)
+    head = tokenize(words[:window], vocab)
+    if not tail or not head:
+        merged.extend(words)
+        return
+    tail_end, head_end, length = longest_common_run(tail, head, MAX_BOUNDARY_SLACK)
+    if length < MIN_OVERLAP_MATCHES:
+        merged.extend(words)
+        return
+
+    # Keep the aligned run once; words cut off at either boundary are dropped
+    del merged[tail_start + tail_end:]
+    merged.extend(words[head_end:])
+
+def merge_overlapping_transcripts(transcripts: List[Optional[str]], window: int = OVERLAP_WINDOW_WORDS,
+                                  gap_marker: Callable[[int], str] = lambda index: "[missing audio]") -> str:
+    """
+    Merge transcripts of consecutive overlapping chunks into one transcript.
+
+    Args:
+        transcripts: Transcripts of consecutive chunks, in order; None marks a chunk that failed
+        window: Number of words at each boundary searched for the overlap
+        gap_marker: Builds the text inserted in place of a failed chunk from its index
+
+    Returns:
+        The merged transcript with duplicated boundary words removed
+    """
+    vocab: Dict[str, int] = {}
+    merged: List[str] = []
+    after_gap = False
+    for index, transcript in enumerate(transcripts):
+        if transcript is None:
+            # The chunks on either side of a gap do not overlap, so never merge across it
+            merged.append(gap_marker(index))
+            after_gap = True
+            continue
+        words = transcript.split()
+        if not words:
+            continue
+        if after_gap:
+            merged.extend(words)
+            after_gap = False
+        else:
+            merge_into(merged, words, vocab, window)
+    return " ".join(merged)
@@ -1,17 +1,34 @@
 from google.oauth2 import service_account
 from googleapiclient.discovery import build
 from googleapiclient.http import MediaIoBaseDownload
-import io
+from google_auth_httplib2 import AuthorizedHttp
+from google.auth.transport.requests import AuthorizedSession
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+import httplib2
+import functools
+import contextlib
+import json
+import time
+import hashlib
+import mmap
 import os
 import argparse
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import logging
 from caption_analyzer import analyze_caption
 from audio_transcriber import transcribe_audio
 from dotenv import load_dotenv
 import tempfile
 import re
+from datetime import datetime
+from typing import Any, ContextManager, Dict, Literal, Optional
 
 # Load environment variables from .env file
 load_dotenv()
+OPENAI_API_KEY = os.getenv('OPENAI_API_KEY')
 
 # Define your constants
 SCOPES = [
@@ -24,66 +41,284 @@ FOLDER_ID = '1urUZgHEsiD2m84o0mRwABx98Hx4zVoRx'
 SHARED_DRIVE_ID = '0AC-zpP62xFGzUk9PVA'
 
 # Supported file extensions
-TEXT_EXTENSIONS = ['.txt']
-AUDIO_EXTENSIONS = ['.mp3', '.wav', '.m4a']
+TEXT_EXTENSIONS = frozenset({'.txt'})
+AUDIO_EXTENSIONS = frozenset({'.mp3', '.wav', '.m4a'})
+
+# Each download chunk is one HTTPS range request; larger chunks mean fewer round trips
+DOWNLOAD_CHUNK_SIZE = int(os.getenv('DRIVE_DOWNLOAD_CHUNK_SIZE', 16 * 1024 * 1024))  # 16MB
+# Media downloads go through a pooled keep-alive session rather than per-service httplib2
+DRIVE_MEDIA_URL = "https://www.googleapis.com/drive/v3/files/{file_id}?alt=media&supportsAllDrives=true"
+DRIVE_POOL_CONNECTIONS = 16
+DRIVE_POOL_MAXSIZE = 64
+DOWNLOAD_TIMEOUT = (10, 300)  # connect, read (seconds)
+SPOOL_MAX_SIZE = 4 * 1024 * 1024  # 4MB
+# Text files larger than this are memory-mapped instead of read into a buffer
+MMAP_MIN_SIZE = 8 * 1024 * 1024  # 8MB
+
+# Downloads are kept in tmp/ and reused while Drive reports the same revision
+TMP_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'tmp')
+CACHE_INDEX_FILE = os.path.join(TMP_DIR, '.cache_index.json')
+# Within this window a cached download is trusted without asking Drive for its metadata
+CACHE_TTL_SECONDS = int(os.getenv('DRIVE_CACHE_TTL', 3600))
+# Only the name (for its extension) and the revision info used to validate cached downloads
+METADATA_FIELDS = "name, modifiedTime, md5Checksum"
+
+# Batch processing limits: downloads are network bound, analysis runs in fewer workers
+MAX_CONCURRENT_DOWNLOADS = 16
+MAX_CONCURRENT_ANALYSES = 4
+# Downloaded files allowed on disk at once: one being analyzed and one waiting per worker
+MAX_DOWNLOADED_FILES = MAX_CONCURRENT_ANALYSES * 2
+# The Drive batch endpoint accepts at most 100 calls per request
+MAX_BATCH_REQUESTS = 100
+
+_thread_state = threading.local()
+_cache_index_lock = threading.Lock()
+
+# Google Drive file links (standard and sharing) in a single pattern
+_FILE_LINK_RE = re.compile(r'https://drive\.google\.com/(?:file/d/|open\?id=)([a-zA-Z0-9_-]+)')
+_DRIVE_ID_RE = re.compile(r'[a-zA-Z0-9_-]+')
+
+@functools.lru_cache(maxsize=1)
+def get_google_credentials():
+    """Load the service account credentials once and share them across services."""
+    # Make sure we're using the full drive scope
+    return service_account.Credentials.from_service_account_file(
+        SERVICE_ACCOUNT_FILE, scopes=SCOPES)
+
+def build_google_drive_service():
+    """Build a new Google Drive service backed by its own authorized HTTP connection."""
+    authed_http = AuthorizedHttp(get_google_credentials(), http=httplib2.Http())
+    # The discovery document bundled with the client library avoids a fetch per build
+    return build('drive', 'v3', http=authed_http, cache_discovery=False, static_discovery=True)
+
+@functools.lru_cache(maxsize=1)
+def _get_cached_drive_service():
+    return build_google_drive_service()
 
 def get_google_drive_service():
-    """Initialize and return Google Drive service."""
+    """Initialize and return the shared Google Drive service."""
     try:
-        # Make sure we're using the full drive scope
-        creds = service_account.Credentials.from_service_account_file(
-            SERVICE_ACCOUNT_FILE, scopes=SCOPES)
-        service = build('drive', 'v3', credentials=creds)
-        return service
+        return _get_cached_drive_service()
     except Exception as e:
         print(f"Error initializing Google Drive service: {str(e)}")
         return None
 
+@functools.lru_cache(maxsize=1)
+def get_drive_session() -> AuthorizedSession:
+    """Return the shared authorized session used for media downloads."""
+    session = AuthorizedSession(get_google_credentials())
+    retries = Retry(total=3, backoff_factor=0.5, status_forcelist=[429, 500, 502, 503, 504])
+    session.mount("https://", HTTPAdapter(
+        pool_connections=DRIVE_POOL_CONNECTIONS,
+        pool_maxsize=DRIVE_POOL_MAXSIZE,
+        max_retries=retries
+    ))
+    return session
+
+def get_thread_drive_service():
+    """Return a Google Drive service owned by the calling thread."""
+    # httplib2 connections are not thread-safe, so each worker thread builds its own service
+    service = getattr(_thread_state, 'service', None)
+    if service is None:
+        service = build_google_drive_service()
+        _thread_state.service = service
+    return service
+
 def download_file_content(service, file_id: str) -> str:
     """Download and return the content of a file from Google Drive."""
     try:
         request = service.files().get_media(fileId=file_id)
-        file_content = io.BytesIO()
-        downloader = MediaIoBaseDownload(file_content, request)
-        
-        done = False
-        while not done:
-            status, done = downloader.next_chunk()
-        
-        return file_content.getvalue().decode('utf-8')
+        # Small files stay in memory; large ones spill to disk instead of growing a BytesIO
+        with tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE) as file_content:
+            downloader = MediaIoBaseDownload(file_content, request, chunksize=DOWNLOAD_CHUNK_SIZE)
+            
+            done = False
+            while not done:
+                status, done = downloader.next_chunk()
+            
+            file_content.seek(0)
+            return file_content.read().decode('utf-8')
     except Exception as e:
         print(f"Error downloading file: {str(e)}")
         return None
 
-def download_file_to_local(service, file_id: str) -> str:
-    """Download a file from Google Drive to a local temporary file."""
+def get_files_metadata(service, file_ids) -> Dict[str, Dict[str, Any]]:
+    """Fetch name and revision info for many files using batched Drive requests."""
+    metadata = {}
+    
+    def callback(request_id, response, exception):
+        if exception is not None:
+            print(f"Error getting metadata for file {request_id}: {str(exception)}")
+        else:
+            metadata[request_id] = response
+    
+    unique_ids = list(dict.fromkeys(file_ids))
+    for start in range(0, len(unique_ids), MAX_BATCH_REQUESTS):
+        batch = service.new_batch_http_request(callback=callback)
+        for file_id in unique_ids[start:start + MAX_BATCH_REQUESTS]:
+            batch.add(
+                service.files().get(fileId=file_id, fields=METADATA_FIELDS, supportsAllDrives=True),
+                request_id=file_id
+            )
+        batch.execute()
+    
+    return metadata
+
+def _load_cache_index() -> Dict[str, Dict[str, Any]]:
+    """Load the download cache index, treating a missing or corrupt file as empty."""
+    try:
+        with open(CACHE_INDEX_FILE, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def _write_cache_index(index: Dict[str, Dict[str, Any]]):
+    """Write the index, dropping entries whose file is gone, and replace the file atomically."""
+    index = {file_id: entry for file_id, entry in index.items() if os.path.exists(entry['path'])}
+    tmp_path = f"{CACHE_INDEX_FILE}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(index, f)
+    os.replace(tmp_path, CACHE_INDEX_FILE)
+
+def _update_cache_index(file_id: str, entry: Dict[str, Any]):
+    """Record a cached download in the index."""
+    with _cache_index_lock:
+        index = _load_cache_index()
+        index[file_id] = entry
+        _write_cache_index(index)
+
+def remove_downloaded_file(path: str) -> bool:
+    """Delete a downloaded file and its cache index entry; returns whether a file was removed."""
+    with _cache_index_lock:
+        removed = os.path.exists(path)
+        if removed:
+            os.unlink(path)
+        index = _load_cache_index()
+        if any(entry['path'] == path for entry in index.values()):
+            _write_cache_index(index)
+    return removed
+
+def _file_md5(path: str) -> str:
+    """Compute the MD5 hex digest of a local file."""
+    digest = hashlib.md5()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+def _parse_drive_time(value: str) -> float:
+    """Convert a Drive RFC 3339 timestamp to a POSIX timestamp."""
+    return datetime.fromisoformat(value.replace('Z', '+00:00')).timestamp()
+
+def _is_cached_copy_fresh(path: str, file_metadata: Dict[str, Any], entry: Optional[Dict[str, Any]]) -> bool:
+    """Check whether a local download still matches the Drive revision described by file_metadata."""
+    if not os.path.exists(path):
+        return False
+    modified_time = file_metadata.get('modifiedTime')
+    if modified_time and os.path.getmtime(path) < _parse_drive_time(modified_time):
+        return False
+    md5_checksum = file_metadata.get('md5Checksum')
+    if not md5_checksum:
+        # Google Docs formats have no checksum; the modification time is all we have
+        return modified_time is not None
+    # Trust the index if it recorded the same checksum, otherwise hash the local copy
+    if entry and entry.get('path') == path and entry.get('md5Checksum') == md5_checksum:
+        return True
+    return _file_md5(path) == md5_checksum
+
+def download_media(file_id: str, path: str):
+    """Download a Drive file's content to path in DOWNLOAD_CHUNK_SIZE range requests."""
+    session = get_drive_session()
+    url = DRIVE_MEDIA_URL.format(file_id=file_id)
+    with open(path, 'wb') as f:
+        start = 0
+        while True:
+            end = start + DOWNLOAD_CHUNK_SIZE - 1
+            with session.get(url, headers={'Range': f"bytes={start}-{end}"}, stream=True,
+                             timeout=DOWNLOAD_TIMEOUT) as response:
+                # An empty file has no satisfiable range
+                if response.status_code == 416 and start == 0:
+                    return
+                response.raise_for_status()
+                for block in response.iter_content(chunk_size=1024 * 1024):
+                    f.write(block)
+                content_range = response.headers.get('Content-Range')
+            # A plain 200 means the server sent the whole file at once
+            if response.status_code != 206 or not content_range:
+                return
+            # Content-Range looks like "bytes 0-16777215/52428800"
+            total = int(content_range.rsplit('/', 1)[1])
+            start = end + 1
+            if start >= total:
+                return
+
+def download_file_to_local(service, file_id: str, file_metadata: Optional[Dict[str, Any]] = None,
+                           known_extension: Optional[str] = None) -> str:
+    """
+    Download a file from Google Drive to a local temporary file, reusing a fresh cached copy.
+
+    Args:
+        service: Google Drive service
+        file_id: ID of the file to download
+        file_metadata: Metadata from an earlier files().get or batch lookup, if the caller has it
+        known_extension: Extension (e.g. ".mp3") to use when the caller already knows the file type;
+            skips the metadata call, at the cost of not validating an existing cached copy
+
+    Returns:
+        Path of the local file, or None if the download failed
+    """
     try:
-        # Get file metadata to determine the file name
-        file_metadata = service.files().get(
-            fileId=file_id, 
-            fields="name, mimeType",
-            supportsAllDrives=True
-        ).execute()
+        entry = _load_cache_index().get(file_id)
+        
+        # A recently validated copy is reused without another metadata call
+        if file_metadata is None and entry and os.path.exists(entry['path']) \
+                and time.time() - entry.get('checked_at', 0) < CACHE_TTL_SECONDS:
+            print(f"Using cached file: {entry['path']}")
+            return entry['path']
+        
+        # The caller knows the file type, so the metadata call is not needed for the name
+        if file_metadata is None and known_extension is not None:
+            file_metadata = {'name': f"{file_id}{known_extension}"}
+        
+        # Get file metadata to determine the file name, unless the caller already has it
+        if file_metadata is None:
+            file_metadata = service.files().get(
+                fileId=file_id, 
+                fields=METADATA_FIELDS,
+                supportsAllDrives=True
+            ).execute()
         
         file_name = file_metadata.get('name', 'downloaded_file')
         
         # Create tmp directory if it doesn't exist
-        tmp_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'tmp')
-        os.makedirs(tmp_dir, exist_ok=True)
+        os.makedirs(TMP_DIR, exist_ok=True)
         
         # Create a file with the same extension as the original
         _, file_extension = os.path.splitext(file_name)
-        temp_path = os.path.join(tmp_dir, f"{file_id}{file_extension}")
+        temp_path = os.path.join(TMP_DIR, f"{file_id}{file_extension}")
         
-        # Download the file
-        request = service.files().get_media(fileId=file_id)
-        with open(temp_path, 'wb') as f:
-            downloader = MediaIoBaseDownload(f, request)
-            done = False
-            while not done:
-                status, done = downloader.next_chunk()
+        if _is_cached_copy_fresh(temp_path, file_metadata, entry):
+            print(f"Using cached file: {temp_path}")
+        else:
+            # Download to a private name and move it into place only once it is complete,
+            # so a failed download never leaves a truncated file at the cached path
+            partial_path = f"{temp_path}.{os.getpid()}.{threading.get_ident()}.part"
+            try:
+                download_media(file_id, partial_path)
+                os.replace(partial_path, temp_path)
+            except BaseException:
+                if os.path.exists(partial_path):
+                    os.unlink(partial_path)
+                raise
+            
+            print(f"Downloaded file to: {temp_path}")
         
-        print(f"Downloaded file to: {temp_path}")
+        _update_cache_index(file_id, {
+            'path': temp_path,
+            'modifiedTime': file_metadata.get('modifiedTime'),
+            'md5Checksum': file_metadata.get('md5Checksum'),
+            'checked_at': time.time()
+        })
         return temp_path
     except Exception as e:
         print(f"Error downloading file: {str(e)}")
@@ -91,140 +326,219 @@ def download_file_to_local(service, file_id: str) -> str:
 
 def extract_file_id_from_link(link: str) -> str:
     """Extract file ID from a Google Drive link."""
-    # Pattern for standard Google Drive file links
-    pattern = r'https://drive\.google\.com/file/d/([a-zA-Z0-9_-]+)'
-    match = re.search(pattern, link)
-    if match:
-        return match.group(1)
-    
-    # Pattern for Google Drive sharing links
-    pattern = r'https://drive\.google\.com/open\?id=([a-zA-Z0-9_-]+)'
-    match = re.search(pattern, link)
+    # Standard Google Drive file links and sharing links
+    match = _FILE_LINK_RE.search(link)
     if match:
         return match.group(1)
     
     # If the input is already a file ID (no URL pattern found)
-    if re.match(r'^[a-zA-Z0-9_-]+$', link):
+    if _DRIVE_ID_RE.fullmatch(link):
         return link
     
     print(f"Error: Could not extract file ID from link: {link}")
     return None
 
+def _file_extension(file_path: str) -> str:
+    """Return the lowercased extension without lowercasing the whole path."""
+    return os.path.splitext(file_path)[1].lower()
+
 def is_text_file(file_path: str) -> bool:
     """Check if the file is a text file based on its extension."""
-    _, ext = os.path.splitext(file_path.lower())
-    return ext in TEXT_EXTENSIONS
+    return _file_extension(file_path) in TEXT_EXTENSIONS
 
 def is_audio_file(file_path: str) -> bool:
     """Check if the file is an audio file based on its extension."""
-    _, ext = os.path.splitext(file_path.lower())
-    return ext in AUDIO_EXTENSIONS
+    return _file_extension(file_path) in AUDIO_EXTENSIONS
 
-def process_file(file_path_or_id, is_drive_file=False):
-    """Process a file either from local path or Google Drive."""
+def _classify(file_path: str) -> Optional[Literal['text', 'audio']]:
+    """Classify a file as text or audio from a single extension lookup."""
+    ext = _file_extension(file_path)
+    if ext in TEXT_EXTENSIONS:
+        return 'text'
+    if ext in AUDIO_EXTENSIONS:
+        return 'audio'
+    return None
+
+class _ScopedTempFile:
+    """Context manager around a downloaded file that deletes it on exit."""
+    
+    def __init__(self, path: Optional[str]):
+        self.path = path
+    
+    def __enter__(self) -> Optional[str]:
+        return self.path
+    
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+    
+    def close(self):
+        """Remove the file if it still exists, along with its cache index entry."""
+        if self.path and remove_downloaded_file(self.path):
+            print(f"Cleaned up temporary file: {self.path}")
+
+def _materialize_to_path(file_path_or_id, is_drive_file=False) -> ContextManager[Optional[str]]:
+    """Return a context manager yielding a local path for the file, or None if it is unavailable."""
+    if not is_drive_file:
+        # Check if the local file exists
+        if not os.path.exists(file_path_or_id):
+            print(f"Error: File not found: {file_path_or_id}")
+            return contextlib.nullcontext(None)
+        return contextlib.nullcontext(file_path_or_id)
+    
+    # Download the file from Google Drive
+    service = get_google_drive_service()
+    temp_file_path = download_file_to_local(service, file_path_or_id)
+    if not temp_file_path:
+        print(f"Failed to download file with ID: {file_path_or_id}")
+    return _ScopedTempFile(temp_file_path)
+
+def read_text_file(file_path: str) -> str:
+    """Read a UTF-8 text file with a single decode of the raw bytes."""
+    with open(file_path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size < MMAP_MIN_SIZE:
+            return f.read().decode('utf-8')
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            return str(mm, 'utf-8')
+
+def _load_content(file_path: str, openai_api_key: str) -> Optional[str]:
+    """Read a text file or transcribe an audio file, returning its content."""
+    file_name = os.path.basename(file_path)
+    file_type = _classify(file_path)
+    
+    if file_type == 'text':
+        return read_text_file(file_path)
+    
+    if file_type == 'audio':
+        print(f"Transcribing audio file: {file_name}")
+        result = transcribe_audio(openai_api_key, file_path)
+        if not result["success"]:
+            print(f"Error transcribing audio: {result.get('error', 'Unknown error occurred')}")
+            return None
+        print("Transcription completed successfully.")
+        return result["transcription"]
+    
+    print(f"Unsupported file type: {file_name}")
+    return None
+
+def _process_input(file_input: ContextManager[Optional[str]]):
+    """Load and analyze one file, releasing the input as soon as its content is loaded."""
     try:
-        # Get OpenAI API key from environment variable
-        openai_api_key = os.getenv('OPENAI_API_KEY')
-        if not openai_api_key:
-            print("Error: OPENAI_API_KEY environment variable not set")
-            return
-        
-        # Initialize variables
-        content = None
-        file_name = None
-        temp_file_path = None
-        
-        if is_drive_file:
-            # Get Google Drive service
-            service = get_google_drive_service()
-            
-            # Download the file from Google Drive
-            temp_file_path = download_file_to_local(service, file_path_or_id)
-            if not temp_file_path:
-                print(f"Failed to download file with ID: {file_path_or_id}")
-                return
-            
-            # Get the file name from the path
-            file_name = os.path.basename(temp_file_path)
-            
-            # Check file type and process accordingly
-            if is_text_file(temp_file_path):
-                # Read the content of the downloaded text file
-                with open(temp_file_path, 'r', encoding='utf-8') as f:
-                    content = f.read()
-            elif is_audio_file(temp_file_path):
-                # Transcribe the audio file
-                print(f"Transcribing audio file: {file_name}")
-                result = transcribe_audio(openai_api_key, temp_file_path)
-                if result["success"]:
-                    content = result["transcription"]
-                    print("Transcription completed successfully.")
-                else:
-                    print(f"Error transcribing audio: {result.get('error', 'Unknown error occurred')}")
-                    return
-            else:
-                print(f"Unsupported file type: {file_name}")
-                return
-        else:
-            # Check if the local file exists
-            if not os.path.exists(file_path_or_id):
-                print(f"Error: File not found: {file_path_or_id}")
-                return
-            
-            # Get the file name from the path
-            file_name = os.path.basename(file_path_or_id)
-            
-            # Check file type and process accordingly
-            if is_text_file(file_path_or_id):
-                # Read the content of the local text file
-                with open(file_path_or_id, 'r', encoding='utf-8') as f:
-                    content = f.read()
-            elif is_audio_file(file_path_or_id):
-                # Transcribe the audio file
-                print(f"Transcribing audio file: {file_name}")
-                result = transcribe_audio(openai_api_key, file_path_or_id)
-                if result["success"]:
-                    content = result["transcription"]
-                    print("Transcription completed successfully.")
-                else:
-                    print(f"Error transcribing audio: {result.get('error', 'Unknown error occurred')}")
-                    return
-            else:
-                print(f"Unsupported file type: {file_name}")
+        with file_input as file_path:
+            if not file_path:
                 return
+            file_name = os.path.basename(file_path)
+            content = _load_content(file_path, OPENAI_API_KEY)
+        
+        # Any temporary input is gone by now; analysis only needs the content
+        if content is None:
+            return
         
         # Analyze the content
         print(f"Analyzing content from: {file_name}")
-        result = analyze_caption(openai_api_key, content)
+        result = analyze_caption(OPENAI_API_KEY, content)
         
         if result["success"]:
             print(f"\nAnalysis for {file_name}:")
             print(result["analysis"])
         else:
             print(f"\nError analyzing {file_name}: {result.get('error', 'Unknown error occurred')}")
-        
-        # Clean up temporary file if it was created
-        if temp_file_path and os.path.exists(temp_file_path):
-            os.unlink(temp_file_path)
-            print(f"Cleaned up temporary file: {temp_file_path}")
-    
     except Exception as e:
         print(f"An error occurred: {str(e)}")
-        # Clean up temporary file if it was created
-        if temp_file_path and os.path.exists(temp_file_path):
-            os.unlink(temp_file_path)
-            print(f"Cleaned up temporary file: {temp_file_path}")
+
+def process_file(file_path_or_id, is_drive_file=False):
+    """Process a file either from local path or Google Drive."""
+    if not OPENAI_API_KEY:
+        print("Error: OPENAI_API_KEY environment variable not set")
+        return
+    
+    _process_input(_materialize_to_path(file_path_or_id, is_drive_file))
+
+def download_with_thread_service(file_id: str, file_metadata: Optional[Dict[str, Any]] = None) -> str:
+    """Download a Drive file using the calling thread's service."""
+    return download_file_to_local(get_thread_drive_service(), file_id, file_metadata)
+
+def get_metadata_with_thread_service(file_ids) -> Dict[str, Dict[str, Any]]:
+    """Fetch file metadata using the calling thread's service."""
+    return get_files_metadata(get_thread_drive_service(), file_ids)
+
+def process_downloaded_file(temp_file: _ScopedTempFile):
+    """Process a downloaded Drive file, removing it once its content is loaded."""
+    _process_input(temp_file)
+
+async def process_files_async(file_ids):
+    """Download Drive files concurrently and process each one as soon as it lands."""
+    downloaded = asyncio.Queue()
+    semaphore = asyncio.Semaphore(MAX_CONCURRENT_DOWNLOADS)
+    # A slot is taken before each download and only freed once the worker has deleted
+    # the file, so disk usage is bounded by the workers rather than by the batch size
+    file_slots = asyncio.Semaphore(MAX_DOWNLOADED_FILES)
+    
+    # Look up every file's metadata in one batch instead of one request per download
+    metadata = await asyncio.to_thread(get_metadata_with_thread_service, file_ids)
+    
+    async def download(file_id):
+        if file_id not in metadata:
+            await downloaded.put((file_id, None))
+            return
+        await file_slots.acquire()
+        try:
+            async with semaphore:
+                temp_file_path = await loop.run_in_executor(
+                    download_executor, download_with_thread_service, file_id, metadata[file_id]
+                )
+        except BaseException:
+            file_slots.release()
+            raise
+        if not temp_file_path:
+            file_slots.release()
+            await downloaded.put((file_id, None))
+            return
+        # The worker that takes this file owns it and its slot, and frees both when done
+        await downloaded.put((file_id, _ScopedTempFile(temp_file_path)))
+    
+    async def download_all():
+        await asyncio.gather(*[download(file_id) for file_id in file_ids])
+        # One sentinel per worker so every worker stops
+        for _ in range(MAX_CONCURRENT_ANALYSES):
+            await downloaded.put(None)
+    
+    async def worker():
+        while (item := await downloaded.get()) is not None:
+            file_id, temp_file = item
+            if temp_file is None:
+                print(f"Failed to download file with ID: {file_id}")
+                continue
+            try:
+                await asyncio.to_thread(process_downloaded_file, temp_file)
+            finally:
+                file_slots.release()
+    
+    # Downloads get their own threads; the default executor is small and its threads
+    # are held by the workers for the whole transcribe and analyze step
+    loop = asyncio.get_running_loop()
+    with ThreadPoolExecutor(max_workers=MAX_CONCURRENT_DOWNLOADS, thread_name_prefix="drive-download") as download_executor:
+        await asyncio.gather(download_all(), *[worker() for _ in range(MAX_CONCURRENT_ANALYSES)])
+
+def process_files(file_ids):
+    """Process several Google Drive files, overlapping downloads with analysis."""
+    if not OPENAI_API_KEY:
+        print("Error: OPENAI_API_KEY environment variable not set")
+        return
+    
+    asyncio.run(process_files_async(file_ids))
 
 def main():
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    
     # Set up argument parser
     parser = argparse.ArgumentParser(description='Analyze caption files or transcribe audio files')
     parser.add_argument('--file', '-f', help='Path to a local file to analyze (text or audio)')
-    parser.add_argument('--drive-file', '-d', help='ID or link of a Google Drive file to analyze (text or audio)')
+    parser.add_argument('--drive-file', '-d', nargs='+', help='IDs or links of Google Drive files to analyze (text or audio)')
     args = parser.parse_args()
     
-    # Get OpenAI API key from environment variable
-    openai_api_key = os.getenv('OPENAI_API_KEY')
-    if not openai_api_key:
+    # Check the OpenAI API key once before processing
+    if not OPENAI_API_KEY:
         print("Error: OPENAI_API_KEY environment variable not set")
         return
     
@@ -235,13 +549,16 @@ def main():
         process_file(args.file, is_drive_file=False)
     
     elif args.drive_file:
-        # Process a Google Drive file
-        file_id = extract_file_id_from_link(args.drive_file)
-        if file_id:
-            print(f"Processing Google Drive file with ID: {file_id}")
-            process_file(file_id, is_drive_file=True)
-        else:
+        # Process Google Drive files
+        file_ids = [extract_file_id_from_link(link) for link in args.drive_file]
+        if not all(file_ids):
             print("Error: Invalid Google Drive link or file ID")
+        elif len(file_ids) == 1:
+            print(f"Processing Google Drive file with ID: {file_ids[0]}")
+            process_file(file_ids[0], is_drive_file=True)
+        else:
+            print(f"Processing {len(file_ids)} Google Drive files")
+            process_files(file_ids)
     
     else:
         # No arguments provided, show usage
@@ -0,0 +1,55 @@
+from lcs_merge import merge_overlapping_transcripts
+
+PARAGRAPH = (
+    "Yesterday we talked about the budget and the plan for the city and the weather was nice today "
+    "so we went to the park and the kids played on the swings while the parents sat on the benches "
+    "and talked about the schools and the new library that the council wants to build next to the "
+    "river. Most of the people there said that the library is a good idea but that the parking is "
+    "going to be a problem, and the mayor said that she would look at the plan again before the vote."
+)
+
+def test_merge_recovers_text_at_every_cut():
+    words = PARAGRAPH.split()
+    failures = []
+    for overlap in (2, 3):
+        for cut in range(1, len(words) - overlap):
+            first = " ".join(words[:cut + overlap])
+            second = " ".join(words[cut:])
+            if merge_overlapping_transcripts([first, second]) != PARAGRAPH:
+                failures.append((overlap, cut))
+    assert failures == []
+
+def test_common_words_far_from_the_boundary_do_not_match():
+    first = "we talked about the budget and the plan for the city and the weather was nice today"
+    second = "nice today so we went to the park and the kids played"
+    assert merge_overlapping_transcripts([first, second]) == (
+        "we talked about the budget and the plan for the city and the weather was nice today "
+        "so we went to the park and the kids played"
+    )
+
+def test_overlap_ignores_case_and_punctuation():
+    first = "and the mayor said she would look at the plan again."
+    second = "Plan again before the vote."
+    # The overlapping words are kept once, as the earlier chunk wrote them
+    assert merge_overlapping_transcripts([first, second]) == (
+        "and the mayor said she would look at the plan again. before the vote."
+    )
+
+def test_chunks_without_overlap_are_concatenated():
+    first = "the kids played on the swings"
+    second = "the parents sat on the benches"
+    assert merge_overlapping_transcripts([first, second]) == (
+        "the kids played on the swings the parents sat on the benches"
+    )
+
+def test_failed_chunk_leaves_a_marked_gap():
+    transcripts = [
+        "the council wants to build a library next to the river",
+        None,
+        "the river is going to be a problem said the mayor",
+    ]
+    # The chunks around the gap do not overlap, so "the river" must not be merged away
+    assert merge_overlapping_transcripts(transcripts) == (
+        "the council wants to build a library next to the river [missing audio] "
+        "the river is going to be a problem said the mayor"
+    )
@@ -1,29 +1,58 @@
 import os
+import hashlib
 import shutil
-import subprocess
 import sys
+import zipfile
 from pathlib import Path
 
-def run_command(cmd):
-    """Run a shell command and raise an exception if it fails."""
-    result = subprocess.run(cmd, shell=True, capture_output=True, text=True)
-    if result.returncode != 0:
-        raise Exception(f"Command failed: {cmd}\nError: {result.stderr}")
-    return result.stdout
+# Fixed timestamp so identical inputs always produce an identical zip
+ZIP_DATE_TIME = (1980, 1, 1, 0, 0, 0)
+
+def hash_inputs(inputs):
+    """Compute a sha256 digest over the contents of the input files."""
+    digest = hashlib.sha256()
+    for path in inputs:
+        digest.update(path.name.encode())
+        digest.update(path.read_bytes())
+    return digest.hexdigest()
+
+def is_zip_up_to_date(zip_path, hash_path, input_hash):
+    """Check whether the zip exists and was built from inputs with the given hash."""
+    return zip_path.exists() and hash_path.exists() and hash_path.read_text().strip() == input_hash
+
+def write_zip(source_dir, zip_path):
+    """Zip a directory deterministically: sorted entries, fixed timestamps and permissions."""
+    with zipfile.ZipFile(zip_path, "w", compression=zipfile.ZIP_DEFLATED, compresslevel=6) as zf:
+        for root, dirs, files in os.walk(source_dir):
+            dirs.sort()
+            for name in sorted(files):
+                path = Path(root) / name
+                info = zipfile.ZipInfo(path.relative_to(source_dir).as_posix(), date_time=ZIP_DATE_TIME)
+                info.external_attr = 0o644 << 16
+                zf.writestr(info, path.read_bytes(), compress_type=zipfile.ZIP_DEFLATED, compresslevel=6)
 
 def package_lambda():
     # Get the directory where this script is located
     script_dir = Path(__file__).parent
     temp_dir = script_dir / "temp"
+    zip_path = script_dir / "start_instance.zip"
+    hash_path = script_dir / "start_instance.zip.sha256"
+    
+    # Skip the rebuild when nothing that goes into the zip has changed
+    input_hash = hash_inputs([script_dir / "start_instance.py", Path(__file__).resolve()])
+    if is_zip_up_to_date(zip_path, hash_path, input_hash):
+        print(f"✅ {zip_path} is up to date")
+        return
     
     try:
         # Create a temporary directory
         print("Creating temporary directory...")
         temp_dir.mkdir(exist_ok=True)
         
-        # Install dependencies
-        print("Installing dependencies...")
-        run_command(f"pip install boto3 -t {temp_dir}")
+        # The Lambda Python runtime already ships boto3, so only the handler is packaged.
+        # Install any future dependency into temp_dir with pip using
+        # --no-deps --no-compile --platform manylinux2014_x86_64 --implementation cp
+        # --python-version 3.9 --only-binary=:all: so no source-built files are shipped.
         
         # Copy the Lambda function
         print("Copying Lambda function...")
@@ -31,13 +60,8 @@ def package_lambda():
         
         # Create the ZIP file
         print("Creating ZIP file...")
-        zip_path = script_dir / "start_instance.zip"
-        if zip_path.exists():
-            zip_path.unlink()
-            
-        # Change to temp directory and create zip
-        os.chdir(temp_dir)
-        run_command(f"zip -r {zip_path} .")
+        write_zip(temp_dir, zip_path)
+        hash_path.write_text(input_hash + "\n")
         
         print(f"✅ Successfully created {zip_path}")
         
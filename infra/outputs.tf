@@ -2,6 +2,14 @@ output "instance_public_ip" {
   value = aws_instance.app.public_ip
 }
 
+output "instance_id" {
+  value = aws_instance.app.id
+}
+
+output "aws_region" {
+  value = var.aws_region
+}
+
 output "vpc_id" {
   value = aws_vpc.main.id
 }
@@ -1,17 +1,32 @@
 #!/usr/bin/env python3
 import os
+import shlex
 import subprocess
 import sys
 from pathlib import Path
 
-def run_command(cmd, check=True):
-    """Run a shell command and optionally check its return code."""
-    print(f"Running: {cmd}")
-    result = subprocess.run(cmd, shell=True, capture_output=True, text=True)
-    if check and result.returncode != 0:
-        print(f"Error: {result.stderr}")
+def run_command(cmd, check=True, capture=False):
+    """
+    Run a command given as an argument list and optionally check its return code.
+
+    Output is streamed line by line as the command runs; pass capture=True only
+    for short commands whose output is needed, which is then returned.
+    """
+    print(f"Running: {shlex.join(cmd)}")
+    if capture:
+        result = subprocess.run(cmd, capture_output=True, text=True)
+        if check and result.returncode != 0:
+            print(f"Error: {result.stderr}")
+            sys.exit(1)
+        return result.stdout
+    
+    with subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, bufsize=1, text=True) as proc:
+        for line in proc.stdout:
+            print(line, end='')
+    if check and proc.returncode != 0:
+        print(f"Error: command exited with status {proc.returncode}")
         sys.exit(1)
-    return result.stdout
+    return None
 
 def get_shell_var(var_name):
     """Get a variable from the shell environment."""
@@ -23,48 +38,51 @@ def get_shell_var(var_name):
 def setup_environment():
     """Set up the system environment."""
     print("Updating package lists...")
-    run_command("apt update -y")
+    run_command(["apt", "update", "-y"])
     
     print("Installing system dependencies...")
-    run_command("apt install -y software-properties-common jq")
+    run_command(["apt", "install", "-y", "software-properties-common", "jq"])
     
     print("Adding Python 3.9 repository...")
-    run_command("add-apt-repository ppa:deadsnakes/ppa -y")
-    run_command("apt update -y")
+    run_command(["add-apt-repository", "ppa:deadsnakes/ppa", "-y"])
+    run_command(["apt", "update", "-y"])
     
     print("Installing Python 3.9 and other dependencies...")
-    run_command("apt install -y python3.9 python3.9-venv python3.9-distutils curl git")
+    run_command(["apt", "install", "-y", "python3.9", "python3.9-venv", "python3.9-distutils", "curl", "git"])
     
     print("Installing pip for Python 3.9...")
-    run_command("curl -sS https://bootstrap.pypa.io/get-pip.py | python3.9")
+    # Download the installer to a file instead of piping it through a shell
+    get_pip_path = "/tmp/get-pip.py"
+    run_command(["curl", "-sS", "-o", get_pip_path, "https://bootstrap.pypa.io/get-pip.py"])
+    run_command(["python3.9", get_pip_path])
 
 def setup_application(app_repo, app_path):
     """Set up the application."""
     if Path(app_path).exists():
         print(f"Directory {app_path} already exists. Deleting...")
-        run_command(f"sudo rm -rf {app_path}")
+        run_command(["sudo", "rm", "-rf", app_path])
 
     print(f"Cloning application repository from {app_repo} to {app_path}...")
-    run_command(f"sudo git clone {app_repo} {app_path}")
+    run_command(["sudo", "git", "clone", app_repo, app_path])
 
     print("Setting up Python virtual environment...")
     os.chdir(app_path)
-    run_command(f"sudo python3.9 -m venv venv")
+    run_command(["sudo", "python3.9", "-m", "venv", "venv"])
     
     print("Activating virtual environment and installing dependencies...")
     venv_python = f"{app_path}/venv/bin/python"
     venv_pip = f"{app_path}/venv/bin/pip"
-    run_command(f"{venv_pip} install -r app/requirements.txt")
+    run_command([venv_pip, "install", "-r", "app/requirements.txt"])
     
     return venv_python
 
 def stop_instance(region):
     """Stop the EC2 instance."""
     print("Getting instance ID...")
-    instance_id = run_command("curl -s http://169.254.169.254/latest/meta-data/instance-id")
+    instance_id = run_command(["curl", "-s", "http://169.254.169.254/latest/meta-data/instance-id"], capture=True).strip()
     
     print(f"Stopping instance {instance_id}...")
-    run_command(f"aws ec2 stop-instances --instance-ids {instance_id} --region {region}")
+    run_command(["aws", "ec2", "stop-instances", "--instance-ids", instance_id, "--region", region])
 
 def main():
     try:
@@ -82,7 +100,7 @@ def main():
         
         # Run the application
         print("Starting application...")
-        run_command(f"{python_path} {os.environ["APP_PATH"]}/app/api.py")
+        run_command([python_path, os.path.join(os.environ["APP_PATH"], "app", "api.py")])
         
         # Stop the instance
         stop_instance(os.environ["AWS_REGION"])
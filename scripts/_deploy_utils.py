@@ -0,0 +1,26 @@
+import functools
+import json
+import shlex
+import subprocess
+import sys
+
+INFRA_DIR = "/Users/wuser/git/learn-terraform/infra"
+
+def run_cmd(cmd, cwd=None):
+    print(f"Running: {shlex.join(cmd)}")
+    result = subprocess.run(cmd, cwd=cwd)
+    if result.returncode != 0:
+        print(f"❌ Command failed: {shlex.join(cmd)}")
+        sys.exit(1)
+
+@functools.lru_cache(maxsize=1)
+def _tf_outputs():
+    """Read all Terraform outputs with a single `terraform output` call."""
+    result = subprocess.run(
+        ["terraform", "output", "-json"],
+        cwd=INFRA_DIR,
+        capture_output=True,
+        text=True,
+        check=True
+    )
+    return json.loads(result.stdout)
@@ -1,12 +1,19 @@
 import os
+import functools
 import subprocess
 import sys
 import argparse
 import json
 import webbrowser
+import boto3
 import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from _deploy_utils import INFRA_DIR, run_cmd, _tf_outputs
 
-INFRA_DIR = "/Users/wuser/git/learn-terraform/infra"
+# Expanded here since commands no longer run through a shell
+CREDENTIALS_DIR = os.path.expanduser("~/git/learn-terraform/credentials")
+KEY_FILE = os.path.join(CREDENTIALS_DIR, "terraform.pem")
 
 def package_lambda():
     """Package the Lambda function before deployment."""
@@ -38,25 +45,41 @@ def load_config():
         print(f"❌ Error loading terraform.tfvars.json: {str(e)}")
         sys.exit(1)
 
-def run_cmd(cmd, cwd=None):
-    print(f"Running: {cmd}")
-    result = subprocess.run(cmd, shell=True, cwd=cwd)
-    if result.returncode != 0:
-        print(f"❌ Command failed: {cmd}")
-        sys.exit(1)
+@functools.lru_cache(maxsize=1)
+def get_ec2_client():
+    """Create an EC2 client for the region the infrastructure is deployed in."""
+    try:
+        region = _tf_outputs().get("aws_region", {}).get("value", "us-west-2")
+    except Exception:
+        region = "us-west-2"
+    return boto3.client("ec2", region_name=region)
+
+def get_instance_ip():
+    """Get the instance public IP, asking EC2 first since it changes whenever the instance starts."""
+    instance_id = get_instance_id()
+    if instance_id:
+        try:
+            reservations = get_ec2_client().describe_instances(InstanceIds=[instance_id])["Reservations"]
+            ip = reservations[0]["Instances"][0].get("PublicIpAddress")
+            if ip:
+                return ip
+        except Exception:
+            pass
+    
+    # Fall back to the address recorded by the last apply
+    try:
+        return _tf_outputs()["instance_public_ip"]["value"]
+    except subprocess.CalledProcessError as e:
+        print("❌ Failed to get instance public IP.")
+        print(e.stderr)
+    except (KeyError, ValueError):
+        print("❌ Failed to get instance public IP.")
+    sys.exit(1)
 
 def get_instance_id():
     """Get the instance ID from Terraform state if it exists."""
     try:
-        result = subprocess.run(
-            ["terraform", "output", "-json"],
-            cwd=INFRA_DIR,
-            capture_output=True,
-            text=True
-        )
-        if result.returncode == 0:
-            outputs = json.loads(result.stdout)
-            return outputs.get("instance_id", {}).get("value")
+        return _tf_outputs().get("instance_id", {}).get("value")
     except Exception:
         pass
     return None
@@ -78,110 +101,105 @@ def check_instance_exists():
     except Exception:
         return False
 
+def check_key_pair(region, key_pair):
+    """Exit unless the key pair exists in the given region."""
+    try:
+        key_pairs = boto3.client("ec2", region_name=region).describe_key_pairs()["KeyPairs"]
+    except Exception as e:
+        print(f"❌ Error checking key pairs in region {region}: {str(e)}")
+        sys.exit(1)
+    if not any(kp["KeyName"] == key_pair for kp in key_pairs):
+        print(f"❌ Key pair '{key_pair}' not found in region {region}")
+        sys.exit(1)
+    print(f"✅ Found key pair '{key_pair}' in region {region}")
+    print(f"✅ Using key pair: {key_pair}")
+
 def deploy_terraform():
-    # Package Lambda function first
-    package_lambda()
+    # Package the Lambda function and check the key pair in the background while Terraform initializes
+    executor = ThreadPoolExecutor(max_workers=2)
+    packaging = executor.submit(package_lambda)
     
     # Get variables from Terraform
     try:
-        result = subprocess.run(
-            ["terraform", "output", "-json"],
-            cwd=INFRA_DIR,
-            capture_output=True,
-            text=True
-        )
-        if result.returncode == 0:
-            outputs = json.loads(result.stdout)
-            region = outputs.get("aws_region", {}).get("value", "us-west-2")
-            key_pair = outputs.get("key_pair", {}).get("value", "terraform")
-        else:
-            print("❌ Failed to get Terraform outputs, using defaults")
-            region = "us-west-2"
-            key_pair = "terraform"
+        outputs = _tf_outputs()
+        region = outputs.get("aws_region", {}).get("value", "us-west-2")
+        key_pair = outputs.get("key_pair", {}).get("value", "terraform")
+    except subprocess.CalledProcessError:
+        print("❌ Failed to get Terraform outputs, using defaults")
+        region = "us-west-2"
+        key_pair = "terraform"
     except Exception as e:
         print(f"❌ Error getting Terraform outputs: {str(e)}")
         region = "us-west-2"
         key_pair = "terraform"
     
-    # Check for key pair in the specified region
-    try:
-        result = subprocess.run(
-            ["aws", "ec2", "describe-key-pairs", "--region", region],
-            capture_output=True,
-            text=True
-        )
-        if result.returncode == 0:
-            key_pairs = json.loads(result.stdout).get("KeyPairs", [])
-            if not any(kp["KeyName"] == key_pair for kp in key_pairs):
-                print(f"❌ Key pair '{key_pair}' not found in region {region}")
-                sys.exit(1)
-            print(f"✅ Found key pair '{key_pair}' in region {region}")
-        else:
-            print(f"❌ Failed to check key pairs in region {region}")
-            sys.exit(1)
-    except Exception as e:
-        print(f"❌ Error checking key pairs: {str(e)}")
-        sys.exit(1)
-
-    print(f"✅ Using key pair: {key_pair}")
+    # Check the key pair in the background while Terraform initializes
+    key_pair_check = executor.submit(check_key_pair, region, key_pair)
 
     # Set the region for Terraform
     os.environ["AWS_DEFAULT_REGION"] = region
 
-    # Check if .terraform directory exists
-    terraform_dir = os.path.join(INFRA_DIR, ".terraform")
-    if os.path.isdir(terraform_dir):
+    # Check if .terraform directory exists in the infra folder, whatever the current directory
+    if (Path(INFRA_DIR) / ".terraform").is_dir():
         print("✅ Terraform already initialized.")
     else:
         print("🔄 Initializing Terraform...")
-        run_cmd("terraform init", cwd=INFRA_DIR)
+        run_cmd(["terraform", "init"], cwd=INFRA_DIR)
 
-    run_cmd("terraform apply -auto-approve -var-file=\"terraform.tfvars.json\"", cwd=INFRA_DIR)
+    # Both background checks must pass, and the apply uploads the Lambda zip
+    key_pair_check.result()
+    packaging.result()
+    executor.shutdown()
 
-    result = subprocess.run(
-        ["terraform", "output", "-raw", "instance_public_ip"],
-        cwd=INFRA_DIR, capture_output=True, text=True
-    )
+    run_cmd(["terraform", "apply", "-auto-approve", "-var-file=terraform.tfvars.json"], cwd=INFRA_DIR)
+    # The apply may have changed the outputs
+    _tf_outputs.cache_clear()
 
-    if result.returncode != 0:
-        print("❌ Failed to get instance public IP.")
-        print(result.stderr)
-        sys.exit(1)
-
-    ip = result.stdout.strip()
+    ip = get_instance_ip()
     try:
         print(f"🔄 Copying credentials to instance at {ip}...")
-        cmd = f"scp -i ~/git/learn-terraform/credentials/terraform.pem -r ~/git/learn-terraform/credentials ubuntu@{ip}:~"
-        run_cmd(cmd)
+        run_cmd(["scp", "-i", KEY_FILE, "-r", CREDENTIALS_DIR, f"ubuntu@{ip}:~"])
     except:
         print("❌ Failed to copy credentials to instance.")
 
     print(f"✅ Instance public IP: {ip}")
 
 def connect_to_instance():
-    result = subprocess.run(
-        ["terraform", "output", "-raw", "instance_public_ip"],
-        cwd=INFRA_DIR, capture_output=True, text=True
-    )
-
-    if result.returncode != 0:
-        print("❌ Failed to get instance public IP.")
-        print(result.stderr)
-        sys.exit(1)
-
-    ip = result.stdout.strip()
-    ssh_cmd = f"ssh -i ~/git/learn-terraform/credentials/terraform.pem ubuntu@{ip}"
+    ip = get_instance_ip()
     print(f"🔗 Connecting to instance at {ip}...")
-    os.system(ssh_cmd)
+    subprocess.run(["ssh", "-i", KEY_FILE, f"ubuntu@{ip}"])
 
 def destroy_infra():
-    run_cmd("terraform destroy", cwd=INFRA_DIR)
+    run_cmd(["terraform", "destroy"], cwd=INFRA_DIR)
+    _tf_outputs.cache_clear()
+
+def set_instance_state(running):
+    """Start or stop the instance with a direct EC2 call instead of a full Terraform apply."""
+    instance_id = get_instance_id()
+    if not instance_id:
+        print("❌ No instance found in Terraform state.")
+        sys.exit(1)
+    
+    ec2 = get_ec2_client()
+    try:
+        if running:
+            print(f"🔄 Starting instance {instance_id}...")
+            ec2.start_instances(InstanceIds=[instance_id])
+            ec2.get_waiter("instance_running").wait(InstanceIds=[instance_id])
+        else:
+            print(f"🔄 Stopping instance {instance_id}...")
+            ec2.stop_instances(InstanceIds=[instance_id])
+            ec2.get_waiter("instance_stopped").wait(InstanceIds=[instance_id])
+    except Exception as e:
+        print(f"❌ Failed to change instance state: {str(e)}")
+        sys.exit(1)
+    print(f"✅ Instance {instance_id} is {'running' if running else 'stopped'}")
 
 def stop_instance():
-    run_cmd("terraform apply -auto-approve -var='instance_state=stopped'", cwd=INFRA_DIR)
+    set_instance_state(running=False)
 
 def start_instance():
-    run_cmd("terraform apply -auto-approve -var='instance_state=running'", cwd=INFRA_DIR)
+    set_instance_state(running=True)
 
 def deploy_or_start():
     """Deploy infrastructure if it doesn't exist, otherwise start the instance."""
@@ -192,30 +210,10 @@ def deploy_or_start():
         print("🔄 No existing instance found, deploying infrastructure...")
         deploy_terraform()
 
-def load_config():
-    """Load configuration from config.json in the infra folder."""
-    try:
-        with open(os.path.join(INFRA_DIR, "config.json")) as f:
-            return json.load(f)
-    except Exception as e:
-        print(f"❌ Error loading config.json: {str(e)}")
-        sys.exit(1)
-
 def open_webpage():
     """Open the application's webpage in the default browser."""
     try:
-        result = subprocess.run(
-            ["terraform", "output", "-raw", "instance_public_ip"],
-            cwd=INFRA_DIR,
-            capture_output=True,
-            text=True
-        )
-        if result.returncode != 0:
-            print("❌ Failed to get instance public IP.")
-            print(result.stderr)
-            sys.exit(1)
-
-        ip = result.stdout.strip()
+        ip = get_instance_ip()
         url = f"http://{ip}:8000/docs"
         print(f"🌐 Opening {url} in your default browser...")
         webbrowser.open(url)
@@ -223,32 +221,33 @@ def open_webpage():
         print(f"❌ Error opening webpage: {str(e)}")
         sys.exit(1)
 
+def run_deploy(args):
+    """Deploy or start the instance, then optionally connect to it or open the webpage."""
+    deploy_or_start()
+    if args.connect:
+        connect_to_instance()
+    elif args.web:
+        open_webpage()
+
 def main():
     parser = argparse.ArgumentParser(description="Manage Terraform EC2 operations.")
-    group = parser.add_mutually_exclusive_group()
+    subparsers = parser.add_subparsers(title="commands")
 
-    group.add_argument("-d", "--deploy", action="store_true", help="Deploy infrastructure or start existing instance")
-    group.add_argument("-x", "--destroy", action="store_true", help="Destroy infrastructure")
-    group.add_argument("-s", "--stop", action="store_true", help="Stop the EC2 instance")
+    deploy_parser = subparsers.add_parser("deploy", help="Deploy infrastructure or start existing instance")
+    deploy_parser.add_argument("-c", "--connect", action="store_true", help="SSH into the instance once it is up")
+    deploy_parser.add_argument("-w", "--web", action="store_true", help="Open the application's webpage once the instance is up")
+    deploy_parser.set_defaults(func=run_deploy)
 
-    parser.add_argument("-c", "--connect", action="store_true", help="SSH into the instance (can be combined with --deploy)")
-    parser.add_argument("-w", "--web", action="store_true", help="Open the application's webpage in your default browser")
+    subparsers.add_parser("destroy", help="Destroy infrastructure").set_defaults(func=lambda args: destroy_infra())
+    subparsers.add_parser("stop", help="Stop the EC2 instance").set_defaults(func=lambda args: stop_instance())
+    subparsers.add_parser("connect", help="SSH into the instance").set_defaults(func=lambda args: connect_to_instance())
+    subparsers.add_parser("web", help="Open the application's webpage in your default browser").set_defaults(func=lambda args: open_webpage())
 
     args = parser.parse_args()
-
-    if args.deploy:
-        deploy_or_start()
-    elif args.destroy:
-        destroy_infra()
-    elif args.stop:
-        stop_instance()
-
-    if args.connect:
-        connect_to_instance()
-    elif args.web:
-        open_webpage()
-    elif not any([args.deploy, args.destroy, args.stop, args.web]):
+    if not hasattr(args, "func"):
         parser.print_help()
+        return
+    args.func(args)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file